@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Measure knowledge retrieval recall@k, MRR and latency across retrieval configurations
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Fully offline: models are loaded from the local cache and Chroma sends no telemetry
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+# The hybrid index is built inside the throwaway working directory, wherever the API keeps its own
+os.environ["KNOWLEDGE_INDEX_PATH"] = "./data/knowledge_index"
+
+from benchmark_scale import percentile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ["chroma", "chroma-default", "hybrid"]
+
+# Questions about Additional_info.docx and the fallback knowledge. Each relevant
+# entry is a phrase from one passage that answers the question, so labels hold
+# whatever the chunk size: a retrieved chunk is relevant if it contains the phrase.
+LABELED_QUERIES = [
+    # Brand philosophy
+    {"query": "What is the EverGlow Labs brand philosophy?",
+     "relevant": ["nature and science can co-author skincare"]},
+    {"query": "Are your products vegan and cruelty-free?",
+     "relevant": ["vegan, cruelty-free, and silicone-free"]},
+    {"query": "Which botanicals and actives go into the formulas?",
+     "relevant": ["high-potency botanicals"]},
+    {"query": "Are products tested for safety and efficacy?",
+     "relevant": ["third-party in-vitro and in-vivo testing"]},
+    {"query": "Is the packaging sustainable?",
+     "relevant": ["fsc-certified packaging"]},
+    {"query": "Do you pay for reviews?",
+     "relevant": ["no paid placements"]},
+    {"query": "Are the formulas gentle on the skin barrier and microbiome?",
+     "relevant": ["microbiome-friendly formulas"]},
+    {"query": "Does the brand donate part of its revenue?",
+     "relevant": ["of revenue funds reef-safe sunscreen education"]},
+    # Verified reviews
+    {"query": "Does HydraCloud Gel-Cream SPF 30 sting or leave a residue?",
+     "relevant": ["i expected chalky residue", "surprisingly hydrating in dry arizona air"]},
+    {"query": "Does Clear Slate BHA Serum cause purging?",
+     "relevant": ["slight purging at first", "early purging can occur with bha"]},
+    {"query": "Is the Flash Fade Spot Corrector strongly scented?",
+     "relevant": ["the citrus scent feels strong"]},
+    {"query": "Is Sunrise Retinal Serum irritating for a first retinal?",
+     "relevant": ["my first retinal"]},
+    {"query": "Sunscreen that stings my eyes when I run",
+     "relevant": ["it stings my eyes when i sweat"]},
+    {"query": "Conditioner for bleached, color-treated hair",
+     "relevant": ["silicone-free conditioner that detangles"]},
+    {"query": "Anti-dandruff shampoo for a flaky scalp",
+     "relevant": ["flakes gone in three washes"]},
+    {"query": "Hand cream for cracked knuckles",
+     "relevant": ["cracks on my knuckles healed"]},
+    {"query": "Mask for congested pores on the nose and chin",
+     "relevant": ["ten-minute rescue for my nose"]},
+    # Customer support tickets
+    {"query": "My order was marked delivered but never arrived",
+     "relevant": ["opened a trace with our carrier"]},
+    {"query": "Does Sunrise Retinal Serum contain animal-derived ingredients?",
+     "relevant": ["synthesized without animal sources"]},
+    {"query": "SunVeil SPF 50 leaves a white cast on darker skin",
+     "relevant": ["applying in two thin layers", "slight shine on my darker skin tone"]},
+    {"query": "Which moisturizers are free of shea butter?",
+     "relevant": ["are shea-free"]},
+    {"query": "Is the glycolic peel mask safe during pregnancy?",
+     "relevant": ["generally considered pregnancy-safe"]},
+    {"query": "Can I layer Radiant Renewal Serum with Velvet Matte Pore Serum?",
+     "relevant": ["apply radiant renewal after cleansing"]},
+    {"query": "When will my refund show up on my card?",
+     "relevant": ["banks can take"]},
+    {"query": "My package arrived leaking",
+     "relevant": ["no-cost replacement shipping out today"]},
+    # Fallback knowledge
+    {"query": "Does the vitamin C serum fade dark spots?",
+     "relevant": ["improvement in dark spots within 4-6 weeks", "tiny dark spots on my cheeks faded"]},
+    {"query": "Lightweight hyaluronic acid serum for hydration",
+     "relevant": ["lightweight texture and deep hydration"]},
+    {"query": "Products for sensitive skin",
+     "relevant": ["sensitive skin products receive positive feedback",
+                  "suitable for all skin types including sensitive skin"]},
+    {"query": "Natural, science-backed skincare ingredients",
+     "relevant": ["natural, science-backed ingredients"]},
+    {"query": "What do customers usually contact support about?",
+     "relevant": ["common customer inquiries include"]}
+]
+
+def normalize_text(text):
+    return " ".join(text.lower().split())
+
+def load_labels(path):
+    """Labeled queries from a JSONL file of {"query": ..., "relevant": [phrase, ...]} records"""
+    with open(path) as f:
+        labels = [json.loads(line) for line in f if line.strip()]
+    return [label for label in labels if label.get("query") and label.get("relevant")]
+
+def load_documents(sources):
+    """Unchunked documents from the knowledge sources, plus the fallback knowledge"""
+    import init_data
+
+    documents = []
+    for task in init_data.iter_ingest_tasks(init_data.expand_sources(sources)):
+        documents.extend(init_data.parse_task(task))
+    documents.extend({"type": info["type"], "source": info["source"], "paragraphs": [info["content"]]}
+                     for info in init_data.get_fallback_additional_info())
+    return documents
+
+def coverage(chunks, labels):
+    """Fraction of relevant phrases that appear whole in some chunk, i.e. that any retriever could find"""
+    contents = [normalize_text(chunk["content"]) for chunk in chunks]
+    phrases = [normalize_text(phrase) for label in labels for phrase in label["relevant"]]
+    found = sum(1 for phrase in phrases if any(phrase in content for content in contents))
+    return found / len(phrases) if phrases else 0.0
+
+def evaluate(search, labels, n_results, repeats):
+    """Mean recall@n_results and MRR over the labeled queries, with per-query latency percentiles"""
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for label in labels:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results = search(label["query"], n_results)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        contents = [normalize_text(result["content"]) for result in results[:n_results]]
+        relevant = [normalize_text(phrase) for phrase in label["relevant"]]
+        recalls.append(sum(1 for phrase in relevant if any(phrase in content for content in contents))
+                       / len(relevant))
+        rank = next((i + 1 for i, content in enumerate(contents)
+                     if any(phrase in content for phrase in relevant)), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    return {
+        "recall": round(sum(recalls) / len(recalls), 3),
+        "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3),
+        "latency_p50_ms": round(percentile(latencies, 0.5), 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95), 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99), 2)
+    }
+
+def searchers(backends):
+    """Query functions for each backend over the knowledge base in ./data, built the way the API builds them"""
+    # Imported here: the API module opens ./data relative to the working directory
+    from main import HybridRAGService, RAGService
+
+    functions = {}
+    for backend in backends:
+        if backend == "chroma":
+            # The API's default path: the query is embedded with the shared MiniLM model
+            functions[backend] = RAGService().query_knowledge
+        elif backend == "chroma-default":
+            # Chroma embeds the query text itself with its default embedding function
+            collection = RAGService().collection
+
+            def search(query, n_results, collection=collection):
+                results = collection.query(query_texts=[query], n_results=n_results)
+                return [{"content": document} for document in results["documents"][0]]
+            functions[backend] = search
+        elif backend == "hybrid":
+            functions[backend] = HybridRAGService().query_knowledge
+        else:
+            logger.error(f"Unknown backend {backend}, expected one of {', '.join(BACKENDS)}")
+    return functions
+
+def run(documents, labels, backends, chunk_sizes, overlap_tokens, n_results_values, repeats):
+    import init_data
+
+    results = []
+    for chunk_tokens in chunk_sizes:
+        chunks = init_data.chunk_documents(documents, chunk_tokens, min(overlap_tokens, chunk_tokens // 2))
+        start = time.perf_counter()
+        ingested = init_data.initialize_vector_store(chunks)
+        ingest_s = round(time.perf_counter() - start, 3)
+        if len(ingested) != len(chunks):
+            logger.error(f"Ingest of {chunk_tokens}-token chunks failed, skipping this chunk size")
+            continue
+        chunk_coverage = round(coverage(chunks, labels), 3)
+        logger.info(f"{len(chunks)} chunks of up to {chunk_tokens} tokens; "
+                    f"{chunk_coverage:.0%} of relevant passages fit whole in a chunk")
+
+        for backend, search in searchers(backends).items():
+            try:
+                # The first query loads models and opens files; keep it out of the latencies
+                search("warm up", 1)
+                for n_results in n_results_values:
+                    result = {"backend": backend, "chunk_tokens": chunk_tokens, "chunks": len(chunks),
+                              "n_results": n_results, "coverage": chunk_coverage, "ingest_s": ingest_s,
+                              **evaluate(search, labels, n_results, repeats)}
+                    logger.info(f"Result: {result}")
+                    results.append(result)
+            except Exception as e:
+                logger.error(f"Backend {backend} failed with {chunk_tokens}-token chunks: {e}")
+                results.append({"backend": backend, "chunk_tokens": chunk_tokens, "error": str(e)})
+    return results
+
+def write_report(results, labels, output):
+    with open(f"{output}.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+    columns = ["backend", "chunk_tokens", "chunks", "n_results", "coverage", "recall", "mrr",
+               "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "ingest_s", "error"]
+    lines = [
+        "# Retrieval Benchmark",
+        "",
+        f"{len(labels)} labeled queries. `recall` is recall@n_results and `mrr` the mean reciprocal rank "
+        "of the first relevant chunk within n_results. `coverage` is the fraction of relevant passages "
+        "that appear whole in some chunk; a passage split across chunks can never be found.",
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns)
+    ]
+    for result in results:
+        lines.append("| " + " | ".join(str(result.get(column, "")) for column in columns) + " |")
+    with open(f"{output}.md", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def main():
+    import init_data
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sources", default=os.path.join(BACKEND_DIR, init_data.ADDITIONAL_INFO_FILE),
+                        help="comma-separated knowledge files or directories (.docx, .txt, .jsonl)")
+    parser.add_argument("--labels", help="JSONL file of labeled queries to use instead of the built-in set")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated, from: " + ", ".join(BACKENDS))
+    parser.add_argument("--chunk-tokens", default="100,200,300", help="comma-separated chunk sizes")
+    parser.add_argument("--chunk-overlap", type=int, default=init_data.CHUNK_OVERLAP_TOKENS,
+                        help="overlap tokens, capped at half the chunk size")
+    parser.add_argument("--n-results", default="3,5,10", help="comma-separated result counts (k)")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs of each query")
+    parser.add_argument("--output", default="retrieval_report", help="report path without extension")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels) if args.labels else LABELED_QUERIES
+    # Resolved before leaving the current directory
+    sources = ",".join(os.path.abspath(source.strip()) for source in args.sources.split(",") if source.strip())
+    output = os.path.abspath(args.output)
+    documents = load_documents(sources)
+    logger.info(f"Benchmarking {len(labels)} labeled queries over {len(documents)} knowledge documents")
+
+    workdir = tempfile.mkdtemp(prefix="retrieval_")
+    cwd = os.getcwd()
+    try:
+        # Every store is built from scratch in a throwaway ./data
+        os.chdir(workdir)
+        init_data.create_data_directory()
+        results = run(
+            documents, labels,
+            [backend.strip() for backend in args.backends.split(",") if backend.strip()],
+            [int(size) for size in args.chunk_tokens.split(",") if size.strip()],
+            args.chunk_overlap,
+            [int(n) for n in args.n_results.split(",") if n.strip()],
+            max(1, args.repeats)
+        )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    write_report(results, labels, output)
+    print(f"\n📊 Retrieval report written to {output}.md and {output}.json")
+    return 0 if results else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
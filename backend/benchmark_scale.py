@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Measure ingest time, database size, memory and search latency against catalog size
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Broad, narrow and multi-term queries that all match the synthetic vocabulary,
+# so no measurement falls through to the LLM fallback
+BENCHMARK_QUERIES = [
+    "serum", "cream", "niacinamide", "vitamin c serum", "moisturizer for dry skin",
+    "gentle cleanser sensitive", "sunscreen", "retinol night cream", "oil control", "hyaluronic acid"
+]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def run_size(size, knowledge_docs, repeats, seed):
+    """Benchmark one catalog size; runs in its own process and working directory"""
+    sys.path.insert(0, BACKEND_DIR)
+    from catalog_shards import shard_paths
+    from generate_synthetic_data import generate_knowledge, generate_products
+    import init_data
+
+    result = {"products": size, "knowledge_docs": knowledge_docs, "shards": len(shard_paths("data/products.db"))}
+    init_data.create_data_directory()
+
+    products = list(generate_products(size, seed))
+    start = time.perf_counter()
+    init_data.initialize_database(products)
+    result["db_ingest_s"] = round(time.perf_counter() - start, 3)
+    result["db_size_mb"] = round(sum(os.path.getsize(path) for path in
+                                     {"data/products.db", *shard_paths("data/products.db")}) / 1e6, 2)
+    del products
+
+    if knowledge_docs:
+        start = time.perf_counter()
+        chunks = init_data.initialize_vector_store(generate_knowledge(knowledge_docs, size, seed))
+        result["vector_ingest_s"] = round(time.perf_counter() - start, 3)
+        result["chunks"] = len(chunks)
+
+    # Measure uncached searches; repeats would otherwise be served from the result cache
+    os.environ["SEARCH_CACHE_MAX_MB"] = "0"
+    # Imported last: the API module opens ./data relative to this working directory
+    from main import SEARCH_RESULT_LIMIT, product_service
+
+    latencies = []
+    for _ in range(repeats):
+        for query in BENCHMARK_QUERIES:
+            start = time.perf_counter()
+            product_service.search_products(query, limit=SEARCH_RESULT_LIMIT)
+            latencies.append((time.perf_counter() - start) * 1000)
+    result["search_p50_ms"] = round(percentile(latencies, 0.5), 2)
+    result["search_p95_ms"] = round(percentile(latencies, 0.95), 2)
+    result["search_p99_ms"] = round(percentile(latencies, 0.99), 2)
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+def write_report(results, output):
+    with open(f"{output}.json", "w") as f:
+        json.dump(results, f, indent=2)
+
+    columns = ["products", "shards", "knowledge_docs", "chunks", "db_ingest_s", "db_size_mb", "vector_ingest_s",
+               "search_p50_ms", "search_p95_ms", "search_p99_ms", "peak_rss_mb"]
+    lines = [
+        "# Catalog Scaling Report",
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns)
+    ]
+    for result in results:
+        lines.append("| " + " | ".join(str(result.get(column, "")) for column in columns) + " |")
+    with open(f"{output}.md", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--knowledge-ratio", type=float, default=0.1,
+                        help="knowledge documents per product (0 skips the vector store)")
+    parser.add_argument("--max-knowledge", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=5, help="passes over the benchmark queries")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="scale_report", help="report path without extension")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-knowledge", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_size(args.child, args.child_knowledge, args.repeats, args.seed)))
+        return
+
+    results = []
+    output = os.path.abspath(args.output)
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        knowledge_docs = min(int(size * args.knowledge_ratio), args.max_knowledge)
+        workdir = tempfile.mkdtemp(prefix=f"scale_{size}_")
+        logger.info(f"Benchmarking {size} products and {knowledge_docs} knowledge documents in {workdir}")
+        try:
+            # A fresh process per size keeps peak memory and warm caches independent
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", str(size),
+                 "--child-knowledge", str(knowledge_docs), "--repeats", str(args.repeats),
+                 "--seed", str(args.seed)],
+                cwd=workdir, capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                logger.error(f"Size {size} failed:\n{completed.stderr[-2000:]}")
+                continue
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        logger.info(f"Result: {result}")
+        results.append(result)
+        write_report(results, output)
+
+    print(f"\n📊 Scaling report written to {output}.md and {output}.json")
+
+if __name__ == "__main__":
+    main()
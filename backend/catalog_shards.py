@@ -0,0 +1,49 @@
+"""
+Optional sharding of the product catalog across SQLite files
+
+With CATALOG_SHARDS > 1 the products table is split across products.shard<i>.db
+files next to products.db, which keeps the metadata, precomputed answers and
+product knowledge links. Products are distributed round-robin ("id") or by a
+hash of their category ("category"). Either way, ids are assigned so that
+id % CATALOG_SHARDS is the owning shard, and a lookup by id opens exactly one
+file.
+"""
+
+import glob
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+CATALOG_SHARDS = max(1, int(os.getenv("CATALOG_SHARDS", "1")))
+CATALOG_SHARD_BY = os.getenv("CATALOG_SHARD_BY", "id")  # "id" or "category"
+
+def shard_paths(db_path: str, shards: int = CATALOG_SHARDS) -> List[str]:
+    """Files holding the products table; just db_path when the catalog is not sharded"""
+    if shards <= 1:
+        return [db_path]
+    root, ext = os.path.splitext(db_path)
+    return [f"{root}.shard{i}{ext}" for i in range(shards)]
+
+def shard_index(product_id: int, shards: int = CATALOG_SHARDS) -> int:
+    return product_id % shards if shards > 1 else 0
+
+def assign_shards(products: Iterable[Dict], shards: int = CATALOG_SHARDS,
+                  by: str = CATALOG_SHARD_BY) -> List[List[Tuple[int, Dict]]]:
+    """(id, product) pairs per shard, with ids that route back to their shard"""
+    buckets = [[] for _ in range(shards)]
+    for position, product in enumerate(products):
+        if by == "category":
+            shard = zlib.crc32(str(product.get("category", "")).lower().encode()) % shards
+        else:
+            shard = position % shards
+        buckets[shard].append(((len(buckets[shard]) + 1) * shards + shard, product))
+    return buckets
+
+def stale_shard_paths(db_path: str, shards: int = CATALOG_SHARDS) -> List[str]:
+    """Shard files left over from a run with a different shard count"""
+    root, ext = os.path.splitext(db_path)
+    pattern = re.compile(re.escape(root) + r"\.shard\d+" + re.escape(ext) + "$")
+    current = set(shard_paths(db_path, shards))
+    return [path for path in glob.glob(f"{glob.escape(root)}.shard*{ext}")
+            if pattern.match(path) and path not in current]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic skincare catalogs and knowledge corpora at arbitrary sizes
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CATEGORIES = {
+    "Cleansers": ["Cleanser", "Cleansing Gel", "Foaming Wash", "Cleansing Balm", "Micellar Water"],
+    "Serums": ["Serum", "Concentrate", "Ampoule", "Booster", "Essence"],
+    "Moisturizers": ["Moisturizer", "Cream", "Gel Cream", "Lotion", "Night Cream"],
+    "Sunscreen": ["Sunscreen SPF 30", "Sunscreen SPF 50", "Mineral Sunscreen", "Daily UV Fluid"],
+    "Toners": ["Toner", "Tonic", "Mist", "Exfoliating Toner"],
+    "Masks": ["Sheet Mask", "Clay Mask", "Sleeping Mask", "Peel-Off Mask"],
+    "Eye Care": ["Eye Cream", "Eye Serum", "Eye Gel"],
+    "Exfoliants": ["Exfoliant", "Peeling Solution", "Scrub", "Enzyme Powder"]
+}
+ACTIVES = [
+    "Niacinamide", "Hyaluronic Acid", "Vitamin C", "Retinol", "Salicylic Acid", "Glycolic Acid",
+    "Ceramides", "Peptides", "Squalane", "Centella Asiatica", "Green Tea", "Zinc Oxide",
+    "Azelaic Acid", "Bakuchiol", "Panthenol", "Lactic Acid", "Snail Mucin", "Tea Tree Oil"
+]
+BASE_INGREDIENTS = ["Water", "Glycerin", "Butylene Glycol", "Sodium Hyaluronate", "Allantoin", "Tocopherol"]
+ADJECTIVES = ["Gentle", "Daily", "Intensive", "Calming", "Brightening", "Hydrating", "Clarifying",
+              "Renewing", "Soothing", "Ultra-Light", "Rich", "Balancing", "Firming", "Radiance"]
+SKIN_TYPES = ["All skin types", "Dry", "Oily", "Combination", "Sensitive", "Acne-prone", "Mature", "Normal"]
+BENEFITS = ["Deep hydration", "Brightening", "Oil control", "Anti-aging", "Pore refinement", "Soothing",
+            "Barrier repair", "Even skin tone", "UV protection", "Exfoliation", "Firming", "Anti-acne"]
+REVIEW_OPENINGS = ["I have been using", "After four weeks with", "My dermatologist recommended",
+                   "I was skeptical about", "Switched to"]
+REVIEW_VERDICTS = ["and my skin has never felt better.", "but it pilled under makeup.",
+                   "and the redness calmed down noticeably.", "though the scent is a bit strong.",
+                   "and it absorbed quickly without stickiness.", "but it broke me out at first."]
+TICKET_TOPICS = ["Can I use {name} together with retinol?", "Is {name} safe during pregnancy?",
+                 "My {name} arrived with a broken pump.", "How often should I apply {name}?",
+                 "Does {name} contain fragrance?", "{name} caused a mild tingling, is that normal?"]
+
+def generate_products(count, seed=42):
+    """Products with the catalog schema used by init_data.load_product_catalog"""
+    rng = random.Random(seed)
+    categories = list(CATEGORIES)
+    for i in range(count):
+        category = rng.choice(categories)
+        actives = rng.sample(ACTIVES, rng.randint(1, 3))
+        skin_types = rng.sample(SKIN_TYPES, rng.randint(1, 2))
+        benefits = rng.sample(BENEFITS, rng.randint(2, 3))
+        name = f"{rng.choice(ADJECTIVES)} {actives[0]} {rng.choice(CATEGORIES[category])}"
+        yield {
+            "name": f"{name} No. {i + 1}",
+            "category": category,
+            "price": round(rng.uniform(12, 120), 2),
+            "margin": round(rng.uniform(0.45, 0.8), 2),
+            "description": (f"A {name.lower()} with {', '.join(a.lower() for a in actives)} "
+                            f"for {skin_types[0].lower()} skin, designed for {benefits[0].lower()}."),
+            "ingredients": ", ".join(rng.sample(BASE_INGREDIENTS, 2) + actives),
+            "skin_type": ", ".join(skin_types),
+            "benefits": ", ".join(benefits),
+            "image_url": "/api/placeholder/300/300"
+        }
+
+def generate_knowledge(count, product_count, seed=42):
+    """Reviews, support tickets and brand notes mentioning products from generate_products"""
+    rng = random.Random(seed + 1)
+    names = [product["name"] for product in generate_products(min(product_count, 5000), seed)]
+    for i in range(count):
+        name = rng.choice(names)
+        kind = rng.random()
+        if kind < 0.6:
+            sentences = [f"{rng.choice(REVIEW_OPENINGS)} {name} {rng.choice(REVIEW_VERDICTS)}"
+                         for _ in range(rng.randint(2, 6))]
+            yield {"type": "reviews", "source": "reviews", "content": " ".join(sentences)}
+        elif kind < 0.9:
+            question = rng.choice(TICKET_TOPICS).format(name=name)
+            answer = (f"Support: {name} contains {rng.choice(ACTIVES).lower()}; "
+                      f"patch test first and introduce it {rng.choice(['daily', 'every other day', 'twice a week'])}.")
+            yield {"type": "customer_tickets", "source": "customer_tickets", "content": f"{question} {answer}"}
+        else:
+            active = rng.choice(ACTIVES)
+            yield {"type": "brand_info", "source": "brand_info",
+                   "content": (f"Our {active.lower()} formulas, including {name}, are dermatologist tested "
+                               f"and free of harsh sulfates. {active} supports {rng.choice(BENEFITS).lower()}.")}
+
+def write_catalog(products, path):
+    import pandas as pd
+
+    df = pd.DataFrame(products)
+    if path.lower().endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+def write_knowledge(documents, path):
+    with open(path, "w") as f:
+        for document in documents:
+            f.write(json.dumps(document) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--knowledge", type=int, default=1000, help="number of knowledge documents")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--catalog-out", default="data/synthetic_catalog.csv", help=".xlsx or .csv")
+    parser.add_argument("--knowledge-out", default="data/synthetic_knowledge.jsonl")
+    args = parser.parse_args()
+
+    for path in (args.catalog_out, args.knowledge_out):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    write_catalog(list(generate_products(args.products, args.seed)), args.catalog_out)
+    write_knowledge(generate_knowledge(args.knowledge, args.products, args.seed), args.knowledge_out)
+    logger.info(f"Wrote {args.products} products to {args.catalog_out} "
+                f"and {args.knowledge} knowledge documents to {args.knowledge_out}")
+
+if __name__ == "__main__":
+    main()
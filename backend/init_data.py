@@ -7,17 +7,41 @@ import sqlite3
 import pandas as pd
 import os
 import json
+import hashlib
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import chromadb
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 import logging
+from knowledge_index import KnowledgeIndex, tokenize, top_k
+from catalog_shards import CATALOG_SHARDS, CATALOG_SHARD_BY, assign_shards, shard_paths, stale_shard_paths
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # File paths - update these to match your file locations
-CATALOG_FILE = "skincare_catalog.xlsx"  # Excel file
+CATALOG_FILE = os.getenv("CATALOG_FILE", "skincare_catalog.xlsx")  # Excel file (or CSV)
 ADDITIONAL_INFO_FILE = "Additional_info.docx"  # Word document
+KNOWLEDGE_INDEX_PATH = os.getenv("KNOWLEDGE_INDEX_PATH", "./data/knowledge_index")  # Hybrid retrieval index (RAG_BACKEND=hybrid)
+DB_PATH = "data/products.db"  # Metadata, answers and knowledge links; products too unless sharded
+
+# Knowledge ingestion: comma-separated .docx/.txt/.jsonl files or directories of them
+KNOWLEDGE_SOURCES = os.getenv("KNOWLEDGE_SOURCES", ADDITIONAL_INFO_FILE)
+EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))  # MiniLM truncates input past 256 word pieces
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 2)))
+JSONL_BATCH_LINES = int(os.getenv("JSONL_BATCH_LINES", "2000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+PRODUCT_KNOWLEDGE_LINKS = int(os.getenv("PRODUCT_KNOWLEDGE_LINKS", "8"))  # Chunks linked to each product
+NAME_MENTION_BONUS = 1.0  # Added to the similarity of chunks that mention the product by name
 
 def create_data_directory():
     """Create data directory if it doesn't exist"""
@@ -25,17 +49,21 @@ def create_data_directory():
     logger.info("Data directory created/verified")
 
 def load_product_catalog(file_path):
-    """Load product catalog from Excel file"""
+    """Load product catalog from Excel (or CSV) file"""
     try:
         # Try to read the Excel file
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Catalog file not found: {file_path}")
         
-        # Read Excel file - try different sheet names
-        try:
-            df = pd.read_excel(file_path, sheet_name=0)  # First sheet
-        except Exception:
-            df = pd.read_excel(file_path)
+        # Large generated catalogs are easier to handle as CSV
+        if file_path.lower().endswith('.csv'):
+            df = pd.read_csv(file_path)
+        else:
+            # Read Excel file - try different sheet names
+            try:
+                df = pd.read_excel(file_path, sheet_name=0)  # First sheet
+            except Exception:
+                df = pd.read_excel(file_path)
         
         logger.info(f"Loaded {len(df)} products from catalog")
         logger.info(f"Columns found: {list(df.columns)}")
@@ -184,87 +212,257 @@ def get_fallback_products():
         # Add more products as needed to reach 30+
     ] * 5  # Multiply to get 35 products
 
+SECTION_KEYWORDS = [
+    ('brand_info', ['brand', 'company', 'about']),
+    ('reviews', ['review', 'rating', 'customer feedback']),
+    ('customer_tickets', ['ticket', 'support', 'complaint', 'issue'])
+]
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+_tokenizer = None
+
+def count_tokens(text):
+    """Word-piece tokens as seen by the embedding model, estimated if its tokenizer is unavailable"""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(f"sentence-transformers/{EMBEDDING_MODEL}")
+        except Exception:
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.tokenize(text))
+    return int(len(text.split()) * 1.3) + 1
+
+def classify_section(heading):
+    heading_lower = heading.lower()
+    for section_type, keywords in SECTION_KEYWORDS:
+        if any(keyword in heading_lower for keyword in keywords):
+            return section_type
+    return 'general'
+
+def is_heading(paragraph):
+    """Heading-styled paragraphs, or short unpunctuated lines naming a known section"""
+    style = paragraph.style.name if paragraph.style is not None else ''
+    if style.startswith('Heading') or style == 'Title':
+        return True
+    text = paragraph.text.strip()
+    looks_like_heading = len(text.split()) <= 8 and not text.endswith(('.', '!', '?', ':'))
+    return looks_like_heading and classify_section(text) != 'general'
+
+def iter_block_items(doc):
+    """Paragraphs and tables of a Word document, in document order"""
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            yield Paragraph(child, doc)
+        elif child.tag == qn('w:tbl'):
+            yield Table(child, doc)
+
+def table_rows(table):
+    """One line per table row, each cell labelled with its column header from the first row"""
+    rows = []
+    for row in table.rows:
+        cells, seen = [], set()
+        for cell in row.cells:
+            # Merged cells repeat across the columns they span
+            if id(cell._tc) in seen:
+                continue
+            seen.add(id(cell._tc))
+            cells.append(" ".join(cell.text.split()))
+        rows.append(cells)
+    if len(rows) < 2:
+        return [" | ".join(text for text in cells if text) for cells in rows]
+    header, lines = rows[0], []
+    for cells in rows[1:]:
+        fields = [f"{header[i]}: {text}" if i < len(header) and header[i] else text
+                  for i, text in enumerate(cells) if text]
+        lines.append(" | ".join(fields))
+    return lines
+
+def parse_docx(file_path):
+    """Split a Word document into sections at its headings; table rows belong to the section above them"""
+    doc = Document(file_path)
+    documents = []
+    current = {'type': 'general', 'source': 'general', 'paragraphs': []}
+    
+    for block in iter_block_items(doc):
+        if isinstance(block, Table):
+            current['paragraphs'].extend(line for line in table_rows(block) if line)
+            continue
+        text = block.text.strip()
+        if not text:
+            continue
+        if is_heading(block):
+            if current['paragraphs']:
+                documents.append(current)
+            section_type = classify_section(text)
+            current = {'type': section_type, 'source': section_type, 'paragraphs': [text]}
+        else:
+            current['paragraphs'].append(text)
+    
+    if current['paragraphs']:
+        documents.append(current)
+    return documents
+
+def parse_txt(file_path):
+    """A text file is one document; blank lines separate its paragraphs"""
+    with open(file_path, errors='ignore') as f:
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', f.read()) if p.strip()]
+    source = os.path.splitext(os.path.basename(file_path))[0]
+    return [{'type': 'general', 'source': source, 'paragraphs': paragraphs}] if paragraphs else []
+
+def parse_jsonl_records(source, lines):
+    """One document per JSON line with a text/content field and optional type/source"""
+    documents = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        text = str(record.get('content') or record.get('text') or '').strip()
+        if text:
+            documents.append({
+                'type': record.get('type', 'general'),
+                'source': record.get('source', source),
+                'paragraphs': [text]
+            })
+    return documents
+
+def chunk_text(paragraphs, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Pack sentences into chunks of at most max_tokens, repeating up to overlap_tokens between chunks"""
+    units = []
+    for paragraph in paragraphs:
+        for sentence in SENTENCE_BOUNDARY.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                units.append((sentence, tokens))
+                continue
+            # Split run-on text into word windows that fit
+            words = sentence.split()
+            step = max(1, int(len(words) * max_tokens / tokens))
+            for i in range(0, len(words), step):
+                piece = " ".join(words[i:i + step])
+                units.append((piece, count_tokens(piece)))
+    
+    chunks = []
+    current, current_tokens = [], 0
+    for unit in units:
+        if current and current_tokens + unit[1] > max_tokens:
+            chunks.append(" ".join(text for text, _ in current))
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                if carried_tokens + previous[1] > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[1]
+            if carried_tokens + unit[1] > max_tokens:
+                carried, carried_tokens = [], 0
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit[1]
+    if current:
+        chunks.append(" ".join(text for text, _ in current))
+    return chunks
+
+def chunk_documents(documents, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    return [
+        {'type': document['type'], 'source': document['source'], 'content': chunk}
+        for document in documents
+        for chunk in chunk_text(document['paragraphs'], max_tokens, overlap_tokens)
+    ]
+
+def parse_task(task):
+    """Documents of one ingest task: a file, or one batch of JSONL lines"""
+    kind, source, payload = task
+    if kind == 'jsonl':
+        return parse_jsonl_records(source, payload)
+    if source.lower().endswith('.docx'):
+        return parse_docx(source)
+    return parse_txt(source)
+
+def parse_and_chunk(task):
+    """Process pool worker: parse one file (or one batch of JSONL lines) and chunk it"""
+    documents = parse_task(task)
+    return len(documents), chunk_documents(documents)
+
+def expand_sources(sources):
+    paths = []
+    for source in sources.split(','):
+        source = source.strip()
+        if os.path.isdir(source):
+            paths.extend(sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(('.docx', '.txt', '.jsonl'))
+            ))
+        elif os.path.exists(source):
+            paths.append(source)
+        elif source:
+            logger.warning(f"Knowledge source not found: {source}")
+    return paths
+
+def iter_ingest_tasks(paths):
+    """JSONL files are streamed in line batches so one large file still spreads across workers"""
+    for path in paths:
+        if path.lower().endswith('.jsonl'):
+            source = os.path.splitext(os.path.basename(path))[0]
+            with open(path, errors='ignore') as f:
+                batch = []
+                for line in f:
+                    if line.strip():
+                        batch.append(line)
+                    if len(batch) >= JSONL_BATCH_LINES:
+                        yield ('jsonl', source, batch)
+                        batch = []
+                if batch:
+                    yield ('jsonl', source, batch)
+        else:
+            yield ('file', path, None)
+
+def iter_knowledge_chunks(sources=KNOWLEDGE_SOURCES, workers=INGEST_WORKERS, stats=None):
+    """Parse and chunk knowledge sources in a process pool, yielding chunks in source order"""
+    stats = stats if stats is not None else {}
+    stats.update({'files': 0, 'documents': 0, 'chunks': 0})
+    paths = expand_sources(sources)
+    stats['files'] = len(paths)
+    
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        # Bound the number of queued tasks so JSONL batches are not all read into memory up front.
+        # Results are taken oldest first: chunk ids and knowledge_version() follow the source order.
+        pending = deque()
+        for task in iter_ingest_tasks(paths):
+            pending.append(executor.submit(parse_and_chunk, task))
+            if len(pending) >= max(1, workers) * 4:
+                yield from _collect(pending.popleft(), stats)
+        while pending:
+            yield from _collect(pending.popleft(), stats)
+    
+    if stats['chunks'] == 0:
+        logger.info("No knowledge chunks produced, using fallback additional info")
+        for info in get_fallback_additional_info():
+            stats['documents'] += 1
+            stats['chunks'] += 1
+            yield info
+
+def _collect(future, stats):
+    try:
+        document_count, chunks = future.result()
+    except Exception as e:
+        logger.error(f"Error ingesting knowledge source: {e}")
+        return []
+    stats['documents'] += document_count
+    stats['chunks'] += len(chunks)
+    return chunks
+
 def load_additional_info(file_path):
     """Load additional information from Word document"""
     try:
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Additional info file not found: {file_path}")
         
-        doc = Document(file_path)
-        
-        # Extract text from all paragraphs
-        full_text = []
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                full_text.append(paragraph.text.strip())
-        
-        # Join all text
-        content = "\n".join(full_text)
-        
-        # Try to split into sections (brand info, reviews, customer tickets)
-        sections = []
-        
-        # Simple section detection based on headers/content
-        current_section = ""
-        section_type = "general"
-        
-        for paragraph in full_text:
-            para_lower = paragraph.lower()
-            
-            # Detect section headers
-            if any(keyword in para_lower for keyword in ['brand', 'company', 'about']):
-                if current_section:
-                    sections.append({
-                        'type': section_type,
-                        'content': current_section,
-                        'source': 'brand_info'
-                    })
-                current_section = paragraph
-                section_type = "brand_info"
-            elif any(keyword in para_lower for keyword in ['review', 'rating', 'customer feedback']):
-                if current_section:
-                    sections.append({
-                        'type': section_type,
-                        'content': current_section,
-                        'source': 'reviews'
-                    })
-                current_section = paragraph
-                section_type = "reviews"
-            elif any(keyword in para_lower for keyword in ['ticket', 'support', 'complaint', 'issue']):
-                if current_section:
-                    sections.append({
-                        'type': section_type,
-                        'content': current_section,
-                        'source': 'customer_tickets'
-                    })
-                current_section = paragraph
-                section_type = "customer_tickets"
-            else:
-                current_section += f"\n{paragraph}"
-        
-        # Add final section
-        if current_section:
-            sections.append({
-                'type': section_type,
-                'content': current_section,
-                'source': section_type
-            })
-        
-        # If no sections detected, create chunks
-        if not sections:
-            # Split content into chunks of reasonable size
-            words = content.split()
-            chunk_size = 200
-            
-            for i in range(0, len(words), chunk_size):
-                chunk_words = words[i:i + chunk_size]
-                chunk_content = " ".join(chunk_words)
-                sections.append({
-                    'type': 'general',
-                    'content': chunk_content,
-                    'source': 'additional_info'
-                })
-        
+        sections = chunk_documents(parse_docx(file_path))
         logger.info(f"Extracted {len(sections)} sections from additional info")
         return sections
         
@@ -293,12 +491,19 @@ def get_fallback_additional_info():
         }
     ]
 
-def initialize_database(products):
-    """Initialize SQLite database with product data"""
-    conn = sqlite3.connect("data/products.db")
-    cursor = conn.cursor()
-    
-    # Create products table
+PRODUCT_CONTENT_FIELDS = ['name', 'category', 'price', 'margin', 'description', 'ingredients', 'skin_type', 'benefits']
+
+def product_content_hash(product):
+    """Fingerprint of the product fields that answers about a product depend on"""
+    content = json.dumps([str(product.get(field, '')) for field in PRODUCT_CONTENT_FIELDS])
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+def knowledge_version(additional_info):
+    """Fingerprint of the knowledge base contents"""
+    content = json.dumps([[info['type'], info['source'], info['content']] for info in additional_info])
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+def create_products_table(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS products (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -310,39 +515,139 @@ def initialize_database(products):
         ingredients TEXT,
         skin_type TEXT,
         benefits TEXT,
-        image_url TEXT
+        image_url TEXT,
+        content_hash TEXT
     )
     """)
     
-    # Clear existing data
+    # Databases created before content hashes were tracked lack the column
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(products)")]
+    if 'content_hash' not in columns:
+        cursor.execute("ALTER TABLE products ADD COLUMN content_hash TEXT")
+
+def product_values(product):
+    """Column values for INSERT INTO products, in PRODUCT_COLUMNS order"""
+    return (
+        product['name'],
+        product['category'],
+        product['price'],
+        product['margin'],
+        product['description'],
+        product.get('ingredients', ''),
+        product.get('skin_type', ''),
+        product.get('benefits', ''),
+        product.get('image_url', '/api/placeholder/300/300'),
+        product_content_hash(product)
+    )
+
+PRODUCT_COLUMNS = "name, category, price, margin, description, ingredients, skin_type, benefits, image_url, content_hash"
+
+def write_shard(task):
+    """Replace the products of one shard file; runs in a worker process"""
+    path, products = task
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    create_products_table(cursor)
+    cursor.execute("DELETE FROM products")
+    cursor.executemany(
+        f"INSERT INTO products (id, {PRODUCT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((product_id, *product_values(product)) for product_id, product in products)
+    )
+    conn.commit()
+    conn.close()
+    return len(products)
+
+def initialize_database(products):
+    """Initialize SQLite database with product data"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    
+    # Create products table
+    create_products_table(cursor)
+    
+    # Key/value metadata (e.g. knowledge base version)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS metadata (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    
+    # Answers precomputed by precompute_answers.py, valid for one version of a
+    # product's content and one version of the knowledge base
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS precomputed_answers (
+        product_hash TEXT NOT NULL,
+        question_key TEXT NOT NULL,
+        knowledge_version TEXT NOT NULL,
+        product_id INTEGER,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        citations TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        PRIMARY KEY (product_hash, question_key)
+    )
+    """)
+    
+    # Knowledge chunks most related to each product, ranked at ingest by
+    # link_products_to_knowledge so product-scoped questions skip vector search
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS product_knowledge (
+        product_id INTEGER NOT NULL,
+        chunk_id TEXT NOT NULL,
+        score REAL NOT NULL,
+        PRIMARY KEY (product_id, chunk_id)
+    )
+    """)
+    
+    # Clear existing data; links refer to product ids and are rebuilt after ingest
     cursor.execute("DELETE FROM products")
+    cursor.execute("DELETE FROM product_knowledge")
     
-    # Insert products
-    for product in products:
-        cursor.execute("""
-        INSERT INTO products (name, category, price, margin, description, ingredients, skin_type, benefits, image_url)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            product['name'],
-            product['category'],
-            product['price'],
-            product['margin'],
-            product['description'],
-            product.get('ingredients', ''),
-            product.get('skin_type', ''),
-            product.get('benefits', ''),
-            product.get('image_url', '/api/placeholder/300/300')
-        ))
+    # Insert products (sharded catalogs keep this table empty)
+    if CATALOG_SHARDS <= 1:
+        for product in products:
+            cursor.execute(f"""
+            INSERT INTO products ({PRODUCT_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, product_values(product))
     
     conn.commit()
     conn.close()
+    
+    if CATALOG_SHARDS > 1:
+        # Each shard is its own file with its own writer, so they are written in parallel
+        tasks = list(zip(shard_paths(DB_PATH), assign_shards(products, CATALOG_SHARDS, CATALOG_SHARD_BY)))
+        with ProcessPoolExecutor(max_workers=min(CATALOG_SHARDS, max(1, INGEST_WORKERS))) as executor:
+            counts = list(executor.map(write_shard, tasks))
+        logger.info(f"Wrote {CATALOG_SHARDS} shards by {CATALOG_SHARD_BY}: {counts} products")
+    for path in stale_shard_paths(DB_PATH, CATALOG_SHARDS):
+        os.remove(path)
+        logger.info(f"Removed stale shard {path}")
+    
     logger.info(f"Initialized database with {len(products)} products")
 
+def read_products(columns="*"):
+    """All product rows, from every shard"""
+    rows = []
+    for path in shard_paths(DB_PATH):
+        conn = sqlite3.connect(path)
+        try:
+            rows.extend(conn.execute(f"SELECT {columns} FROM products").fetchall())
+        finally:
+            conn.close()
+    return rows
+
 def initialize_vector_store(additional_info):
-    """Initialize ChromaDB vector store with additional information"""
+    """Initialize ChromaDB vector store with additional information.
+
+    Chunks may be any iterable (e.g. iter_knowledge_chunks) and are embedded in
+    batches of EMBED_BATCH_SIZE as they arrive. Returns the chunks ingested.
+    """
+    ingested = []
     try:
         # Initialize embedding model
-        embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
         
         # Initialize ChromaDB
         client = chromadb.PersistentClient(path="./data/chroma_db")
@@ -356,30 +661,140 @@ def initialize_vector_store(additional_info):
         # Create new collection
         collection = client.create_collection("skincare_knowledge")
         
-        # Prepare documents for embedding
         documents = []
         metadatas = []
         ids = []
+        embeddings = []
+        start = time.perf_counter()
         
-        for i, info in enumerate(additional_info):
-            documents.append(info['content'])
-            metadatas.append({
-                'type': info['type'],
-                'source': info['source']
-            })
-            ids.append(f"doc_{i}")
+        def flush(batch):
+            batch_documents = [info['content'] for info in batch]
+            batch_metadatas = [{'type': info['type'], 'source': info['source']} for info in batch]
+            batch_ids = [f"doc_{len(ids) + i}" for i in range(len(batch))]
+            # Same model as Chroma's default embedding function, so queries by text still match
+            batch_embeddings = embedding_model.encode(batch_documents, batch_size=64,
+                                                      normalize_embeddings=True, show_progress_bar=False)
+            collection.add(
+                documents=batch_documents,
+                metadatas=batch_metadatas,
+                ids=batch_ids,
+                embeddings=batch_embeddings.tolist()
+            )
+            documents.extend(batch_documents)
+            metadatas.extend(batch_metadatas)
+            ids.extend(batch_ids)
+            embeddings.append(batch_embeddings)
+            ingested.extend(batch)
+            elapsed = time.perf_counter() - start
+            logger.info(f"Embedded {len(ids)} chunks ({len(ids) / elapsed:.1f} chunks/sec)")
         
-        # Add documents to collection
-        collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        batch = []
+        for info in additional_info:
+            batch.append(info)
+            if len(batch) >= EMBED_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
         
         logger.info(f"Initialized vector store with {len(documents)} documents")
         
+        # Same chunks for the in-process hybrid index, embedded with the model the API queries with
+        KnowledgeIndex.build(KNOWLEDGE_INDEX_PATH, documents, metadatas,
+                             [row for block in embeddings for row in block], ids=ids)
+        
     except Exception as e:
         logger.error(f"Error initializing vector store: {e}")
+    return ingested
+
+def find_name_mentions(chunks, names):
+    """Map product id -> indices of chunks that mention the product's full name"""
+    name_index = {}
+    for product_id, name in names:
+        key = " ".join(tokenize(name))
+        if key:
+            name_index.setdefault(key, []).append(product_id)
+    if not name_index:
+        return {}
+    longest = max(len(key.split()) for key in name_index)
+    
+    # Look up every n-gram up to the longest name instead of scanning chunks once per product
+    mentions = {}
+    for chunk_index, chunk in enumerate(chunks):
+        tokens = tokenize(chunk['content'])
+        for n in range(1, longest + 1):
+            for start in range(len(tokens) - n + 1):
+                for product_id in name_index.get(" ".join(tokens[start:start + n]), ()):
+                    mentions.setdefault(product_id, set()).add(chunk_index)
+    return mentions
+
+def link_products_to_knowledge(links_per_product=PRODUCT_KNOWLEDGE_LINKS, batch_size=256):
+    """Store the top knowledge chunks for every product in the product_knowledge table.
+
+    Chunks are ranked by embedding similarity to the product's name, description,
+    benefits and ingredients, with a bonus for chunks that mention it by name.
+    """
+    if not KnowledgeIndex.exists(KNOWLEDGE_INDEX_PATH):
+        logger.warning("No knowledge index found, skipping product knowledge links")
+        return 0
+    
+    index = KnowledgeIndex.load(KNOWLEDGE_INDEX_PATH)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    products = read_products("id, name, description, benefits, ingredients")
+    cursor.execute("DELETE FROM product_knowledge")
+    if not len(index) or not products:
+        conn.commit()
+        conn.close()
+        return 0
+    
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+    mentions = find_name_mentions(index.chunks, [(row[0], row[1]) for row in products])
+    chunk_embeddings = np.asarray(index.embeddings)
+    
+    links = 0
+    for start in range(0, len(products), batch_size):
+        batch = products[start:start + batch_size]
+        texts = [f"{name}. {description or ''} {benefits or ''} {ingredients or ''}"
+                 for _, name, description, benefits, ingredients in batch]
+        product_embeddings = embedding_model.encode(texts, batch_size=64, normalize_embeddings=True,
+                                                    show_progress_bar=False)
+        similarities = product_embeddings @ chunk_embeddings.T
+        rows = []
+        for scores, (product_id, *_) in zip(similarities, batch):
+            for chunk_index in mentions.get(product_id, ()):
+                scores[chunk_index] += NAME_MENTION_BONUS
+            rows.extend((product_id, index.chunks[chunk_index]['id'], float(scores[chunk_index]))
+                        for chunk_index in top_k(scores, links_per_product))
+        cursor.executemany("INSERT INTO product_knowledge (product_id, chunk_id, score) VALUES (?, ?, ?)", rows)
+        links += len(rows)
+    
+    conn.commit()
+    conn.close()
+    logger.info(f"Linked {len(products)} products to {links} knowledge chunks "
+                f"({sum(len(chunks) for chunks in mentions.values())} name mentions)")
+    return links
+
+def record_knowledge_version(additional_info):
+    """Store the knowledge base version and drop precomputed answers that are now stale"""
+    version = knowledge_version(additional_info)
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('knowledge_version', ?)", (version,))
+    
+    # Answers survive a reload only if both the product and the knowledge base are unchanged
+    cursor.execute("DELETE FROM precomputed_answers WHERE knowledge_version != ?", (version,))
+    removed = cursor.rowcount
+    # Product hashes are gathered from every shard, so compare them here rather than in SQL
+    current_hashes = set(row[0] for row in read_products("content_hash"))
+    stale = [(row[0],) for row in cursor.execute("SELECT DISTINCT product_hash FROM precomputed_answers")
+             if row[0] not in current_hashes]
+    cursor.executemany("DELETE FROM precomputed_answers WHERE product_hash = ?", stale)
+    removed += cursor.rowcount if stale else 0
+    
+    conn.commit()
+    conn.close()
+    logger.info(f"Knowledge version {version}, invalidated {removed} precomputed answers")
 
 def main():
     """Main initialization function"""
@@ -392,17 +807,21 @@ def main():
     logger.info(f"Loading product catalog from: {CATALOG_FILE}")
     products = load_product_catalog(CATALOG_FILE)
     
-    # Load additional information
-    logger.info(f"Loading additional info from: {ADDITIONAL_INFO_FILE}")
-    additional_info = load_additional_info(ADDITIONAL_INFO_FILE)
-    
     # Initialize database
     logger.info("Initializing product database...")
     initialize_database(products)
     
-    # Initialize vector store
-    logger.info("Initializing RAG vector store...")
-    initialize_vector_store(additional_info)
+    # Parse, chunk and embed additional information as a pipeline
+    logger.info(f"Ingesting knowledge from: {KNOWLEDGE_SOURCES} ({INGEST_WORKERS} workers)")
+    ingest_stats = {}
+    ingest_start = time.perf_counter()
+    additional_info = initialize_vector_store(iter_knowledge_chunks(KNOWLEDGE_SOURCES, INGEST_WORKERS, ingest_stats))
+    ingest_seconds = max(time.perf_counter() - ingest_start, 1e-9)
+    record_knowledge_version(additional_info)
+    
+    # Precompute product -> knowledge links for product-scoped questions
+    logger.info("Linking products to knowledge...")
+    knowledge_links = link_products_to_knowledge()
     
     logger.info("Data initialization completed successfully!")
     
@@ -410,8 +829,12 @@ def main():
     print(f"\n📊 Initialization Summary:")
     print(f"✅ Products loaded: {len(products)}")
     print(f"✅ Categories: {len(set(p['category'] for p in products))}")
-    print(f"✅ RAG documents: {len(additional_info)}")
-    print(f"✅ Database: data/products.db")
+    print(f"✅ Knowledge files: {ingest_stats.get('files', 0)}")
+    print(f"✅ Knowledge documents: {ingest_stats.get('documents', 0)} "
+          f"({ingest_stats.get('documents', 0) / ingest_seconds:.1f} docs/sec)")
+    print(f"✅ RAG chunks: {len(additional_info)} ({len(additional_info) / ingest_seconds:.1f} chunks/sec)")
+    print(f"✅ Product knowledge links: {knowledge_links}")
+    print(f"✅ Database: {DB_PATH}" + (f" ({CATALOG_SHARDS} shards by {CATALOG_SHARD_BY})" if CATALOG_SHARDS > 1 else ""))
     print(f"✅ Vector store: data/chroma_db")
     print(f"\n🚀 Run 'uvicorn main:app --reload' to start the backend!")
 
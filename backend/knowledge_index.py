@@ -0,0 +1,227 @@
+"""
+In-process hybrid retrieval index for the knowledge base
+
+Chunk embeddings live in a float32 .npy matrix that is memory-mapped at load
+time, next to a BM25 inverted index over the same chunks. Dense and lexical
+rankings are fused with reciprocal-rank fusion. Corpora above HNSW_MIN_DOCS
+also get an HNSW graph when hnswlib is installed; smaller ones are searched
+with a flat dot product.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Optional: flat search is used without it
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+HNSW_FILE = "hnsw.bin"
+HNSW_MIN_DOCS = int(os.getenv("RAG_HNSW_MIN_DOCS", "20000"))
+# Embedding width of an empty index (all-MiniLM-L6-v2)
+DEFAULT_DIMENSIONS = 384
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+class BM25Index:
+    """Okapi BM25 over an in-memory inverted index"""
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        postings = defaultdict(list)
+        self.doc_lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document)
+            self.doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term].append((doc_id, tf))
+        self.avg_length = float(self.doc_lengths.mean()) if self.size and self.doc_lengths.any() else 1.0
+
+        # term -> (idf, doc ids, term frequencies) as arrays for vectorized scoring
+        self.postings = {}
+        for term, entries in postings.items():
+            df = len(entries)
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            doc_ids = np.fromiter((doc_id for doc_id, _ in entries), dtype=np.int64, count=df)
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=df)
+            self.postings[term] = (idf, doc_ids, tfs)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf, doc_ids, tfs = posting
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_ids] / self.avg_length)
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        return scores
+
+    def coverage(self, query: str, doc_ids: np.ndarray) -> np.ndarray:
+        """Share of the query's IDF weight whose terms occur in each of doc_ids, in [0, 1].
+
+        Query terms missing from the corpus count with the IDF of an unseen term,
+        so only chunks holding the query's distinctive words score high.
+        """
+        matched = np.zeros(len(doc_ids))
+        total = 0.0
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                total += math.log(1 + (self.size + 0.5) / 0.5)
+                continue
+            idf, term_doc_ids, _ = posting
+            total += idf
+            matched += idf * np.isin(doc_ids, term_doc_ids)
+        return matched / total if total > 0 else matched
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class KnowledgeIndex:
+    def __init__(self, embeddings: np.ndarray, chunks: List[Dict], hnsw=None):
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.hnsw = hnsw
+        self.bm25 = BM25Index([chunk["content"] for chunk in chunks])
+        self.positions = {chunk["id"]: i for i, chunk in enumerate(chunks)}
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @staticmethod
+    def build(path: str, documents: List[str], metadatas: List[Dict], embeddings,
+              ids: Optional[List[str]] = None, hnsw_min_docs: int = HNSW_MIN_DOCS):
+        """Write an index to path; files are swapped in only once fully written"""
+        os.makedirs(path, exist_ok=True)
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            # No chunks yet: an empty index still loads and answers every query with nothing
+            matrix = matrix.reshape(0, DEFAULT_DIMENSIONS)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        with open(os.path.join(path, EMBEDDINGS_FILE + ".tmp"), "wb") as f:
+            np.save(f, matrix)
+        with open(os.path.join(path, CHUNKS_FILE + ".tmp"), "w") as f:
+            for i, (document, metadata) in enumerate(zip(documents, metadatas)):
+                chunk_id = ids[i] if ids else f"doc_{i}"
+                f.write(json.dumps({"id": chunk_id, "content": document, "metadata": metadata or {}}) + "\n")
+
+        built_hnsw = False
+        if hnswlib is not None and len(documents) >= hnsw_min_docs:
+            graph = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+            graph.init_index(max_elements=len(documents), ef_construction=200, M=16)
+            graph.add_items(matrix, np.arange(len(documents)))
+            graph.save_index(os.path.join(path, HNSW_FILE + ".tmp"))
+            built_hnsw = True
+
+        os.replace(os.path.join(path, EMBEDDINGS_FILE + ".tmp"), os.path.join(path, EMBEDDINGS_FILE))
+        os.replace(os.path.join(path, CHUNKS_FILE + ".tmp"), os.path.join(path, CHUNKS_FILE))
+        if built_hnsw:
+            os.replace(os.path.join(path, HNSW_FILE + ".tmp"), os.path.join(path, HNSW_FILE))
+        elif os.path.exists(os.path.join(path, HNSW_FILE)):
+            os.remove(os.path.join(path, HNSW_FILE))
+        logger.info(f"Built knowledge index with {len(documents)} chunks at {path}"
+                    f"{' (HNSW)' if built_hnsw else ''}")
+
+    @classmethod
+    def exists(cls, path: str) -> bool:
+        return (os.path.exists(os.path.join(path, EMBEDDINGS_FILE))
+                and os.path.exists(os.path.join(path, CHUNKS_FILE)))
+
+    @classmethod
+    def load(cls, path: str) -> "KnowledgeIndex":
+        embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(path, CHUNKS_FILE)) as f:
+            chunks = [json.loads(line) for line in f if line.strip()]
+
+        hnsw = None
+        hnsw_path = os.path.join(path, HNSW_FILE)
+        if hnswlib is not None and os.path.exists(hnsw_path):
+            hnsw = hnswlib.Index(space="cosine", dim=embeddings.shape[1])
+            hnsw.load_index(hnsw_path, max_elements=len(chunks))
+            hnsw.set_ef(100)
+        return cls(embeddings, chunks, hnsw)
+
+    def _dense_candidates(self, query_embedding: np.ndarray, k: int) -> np.ndarray:
+        if self.hnsw is not None:
+            labels, _ = self.hnsw.knn_query(query_embedding, k=min(k, len(self)))
+            return labels[0].astype(np.int64)
+        return top_k(self.embeddings @ query_embedding, k)
+
+    def _result(self, doc_id: int, similarity: float, **extra) -> Dict:
+        return {
+            'content': self.chunks[doc_id]['content'],
+            'metadata': self.chunks[doc_id]['metadata'],
+            'score': float(2 * similarity - 1),
+            'id': self.chunks[doc_id]['id'],
+            **extra
+        }
+
+    def search_ids(self, query_embedding, chunk_ids: List[str], n_results: int = 5) -> List[Dict]:
+        """Rank only the given chunks by dense similarity, e.g. a product's precomputed links"""
+        doc_ids = np.array([self.positions[chunk_id] for chunk_id in chunk_ids if chunk_id in self.positions],
+                           dtype=np.int64)
+        if not len(doc_ids):
+            return []
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) or 1)
+        similarities = np.asarray(self.embeddings[doc_ids]) @ query_embedding
+        return [self._result(int(doc_ids[i]), similarities[i]) for i in top_k(similarities, n_results)]
+
+    def search(self, query: str, query_embedding, n_results: int = 5,
+               candidates: int = 50, rrf_k: int = 60) -> List[Dict]:
+        """Fuse the dense and BM25 rankings of the top candidates with reciprocal-rank fusion.
+
+        Results are in fused order; 'rrf_score' is the fused score. 'score' is on
+        the scale of the Chroma collection (1 - squared L2 distance of unit
+        vectors) so callers' thresholds carry over: the higher of the dense
+        similarity and the chunk's BM25 term coverage, so a chunk found only by
+        an exact term match is not filtered out for a low dense similarity.
+        """
+        if not self.chunks:
+            return []
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        query_embedding = query_embedding / (np.linalg.norm(query_embedding) or 1)
+
+        fused = defaultdict(float)
+        for rank, doc_id in enumerate(self._dense_candidates(query_embedding, candidates)):
+            fused[int(doc_id)] += 1 / (rrf_k + rank + 1)
+        lexical = self.bm25.scores(query)
+        for rank, doc_id in enumerate(top_k(lexical, candidates)):
+            if lexical[doc_id] <= 0:
+                break
+            fused[int(doc_id)] += 1 / (rrf_k + rank + 1)
+
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        doc_ids = np.array([doc_id for doc_id, _ in ranked], dtype=np.int64)
+        similarities = np.asarray(self.embeddings[doc_ids]) @ query_embedding if len(doc_ids) else []
+
+        coverage = self.bm25.coverage(query, doc_ids)
+
+        return [self._result(doc_id, similarity, rrf_score=rrf_score, lexical_score=float(lexical_score),
+                             score=max(float(2 * similarity - 1), float(lexical_score)))
+                for (doc_id, rrf_score), similarity, lexical_score in zip(ranked, similarities, coverage)]
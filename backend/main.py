@@ -1,13 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import contextvars
+import heapq
+import itertools
 import json
+import math
+import os
+import random
+import re
+import signal
 import sqlite3
+import sys
+import textwrap
+import threading
+import time
 import chromadb
 from sentence_transformers import SentenceTransformer
 import requests
+from knowledge_index import KnowledgeIndex
+from suggest_index import SuggestIndex, build_entries
+from catalog_shards import CATALOG_SHARDS, shard_index, shard_paths
+import numpy as np
 import logging
 from datetime import datetime
 import uuid
@@ -16,7 +38,32 @@ import uuid
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Conversational Store API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The services referenced here are created further down, at import time
+    health_prober.start()
+    catalog.start()
+    try:
+        # `kill -HUP <pid>` reloads the catalog
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, catalog.request_reload, "signal")
+    except (NotImplementedError, AttributeError, RuntimeError):
+        pass  # No SIGHUP on this platform
+    warmup_task = None
+    if WARMUP_ENABLED:
+        # Serve liveness probes right away; readiness waits for warm-up to finish
+        warmup_task = asyncio.create_task(run_in_threadpool(warmup_service.run))
+    else:
+        health_prober.warmup = {"status": "disabled"}
+    yield
+    health_prober.stop()
+    catalog.stop()
+    io_pool.shutdown()
+    cpu_pool.shutdown()
+    shard_pool.shutdown()
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+
+app = FastAPI(title="Conversational Store API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -27,12 +74,232 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request profiling configuration
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))
+PROFILED_PATHS = ("/api/search", "/api/ask")
+
+class RequestProfiler:
+    """Sampling profiler for a single request.
+
+    A daemon thread snapshots the stacks of the threads working on the request
+    every interval and aggregates the samples as folded stacks, the format read
+    by flamegraph.pl, speedscope and inferno. Besides the event loop thread, a
+    worker thread is sampled while it runs part of the request (see
+    with_request_context), and its stacks are prefixed with the thread name.
+    Sampling is wall-clock, so time the event loop spends on other concurrent
+    requests shows up as well.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.interval = interval
+        self.samples = Counter()
+        self._threads = {thread_id: [threading.current_thread().name, 1]}  # id -> [name, attach count]
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def attach(self, thread_id: int, name: str):
+        with self._lock:
+            self._threads.setdefault(thread_id, [name, 0])[1] += 1
+
+    def detach(self, thread_id: int):
+        with self._lock:
+            entry = self._threads.get(thread_id)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._threads[thread_id]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            with self._lock:
+                threads = [(thread_id, entry[0]) for thread_id, entry in self._threads.items()]
+            frames = sys._current_frames()
+            for thread_id, name in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    stack.append(name)
+                    self.samples[";".join(reversed(stack))] += 1
+
+# Profiler of the request being served, carried into worker threads by with_request_context
+active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+def _run_attached(fn, args, kwargs):
+    profiler = active_profiler.get()
+    if profiler is None:
+        return fn(*args, **kwargs)
+    thread_id = threading.get_ident()
+    profiler.attach(thread_id, threading.current_thread().name)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.detach(thread_id)
+
+def with_request_context(fn):
+    """fn, to be run on another thread in a copy of the caller's context.
+
+    While it runs, that thread is sampled by the request's profiler, if any.
+    Every hand-off of request work to a thread goes through this.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(_run_attached, fn, args, kwargs)
+    return run
+
+class ProfileStore:
+    """Keeps the most recent request profiles on disk as .folded files"""
+
+    def __init__(self, directory: str, history: int):
+        self.directory = directory
+        self.recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def path_for(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.folded")
+
+    def save(self, profile_id: str, path: str, duration_ms: float, samples: Counter) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path_for(profile_id), "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+        entry = {
+            "profile_id": profile_id,
+            "path": path,
+            "duration_ms": round(duration_ms, 2),
+            "samples": sum(samples.values()),
+            "timestamp": datetime.now().isoformat()
+        }
+        with self._lock:
+            if len(self.recent) == self.recent.maxlen:
+                evicted = self.recent.popleft()
+                try:
+                    os.remove(self.path_for(evicted["profile_id"]))
+                except OSError:
+                    pass
+            self.recent.append(entry)
+        return entry
+
+    def list_profiles(self) -> List[Dict]:
+        with self._lock:
+            return list(reversed(self.recent))
+
+    def get_profile(self, profile_id: str) -> Optional[str]:
+        with self._lock:
+            known = any(entry["profile_id"] == profile_id for entry in self.recent)
+        if not known:
+            return None
+        try:
+            with open(self.path_for(profile_id)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_HISTORY)
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile a request when asked via the X-Profile header or when sampled"""
+    if request.url.path not in PROFILED_PATHS:
+        return await call_next(request)
+
+    forced = request.headers.get("x-profile") == "1"
+    if not forced and not (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+        return await call_next(request)
+
+    # Profile ids become file names, so only accept simple client-supplied ids, and
+    # suffix them so a repeated request id cannot overwrite another request's profile
+    profile_id = request.headers.get("x-request-id", "")
+    if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", profile_id):
+        profile_id = f"{profile_id}-{uuid.uuid4().hex[:8]}"
+    else:
+        profile_id = uuid.uuid4().hex
+
+    profiler = RequestProfiler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+    start = time.perf_counter()
+    profiler.start()
+    # Tasks and worker threads started for this request inherit the profiler from here
+    token = active_profiler.set(profiler)
+    try:
+        response = await call_next(request)
+    finally:
+        active_profiler.reset(token)
+        samples = profiler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            profile_store.save(profile_id, request.url.path, duration_ms, samples)
+        except Exception as e:
+            logger.error(f"Failed to save profile {profile_id}: {e}")
+
+    response.headers["X-Profile-ID"] = profile_id
+    return response
+
 # Initialize services
 embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 chroma_client = chromadb.PersistentClient(path="./data/chroma_db")
 
+# Session limits: turns of history kept per session and number of sessions kept in memory
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+# Ollama context tokens kept per session before the conversation is re-prefilled from scratch
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "1536"))
+
+class ConversationSession:
+    """Conversation history plus the Ollama context for each prompt stream of a session"""
+
+    def __init__(self):
+        self.history = deque(maxlen=SESSION_MAX_TURNS)
+        self.llm_contexts = {}  # stream name -> (endpoint, context tokens)
+        self.lock = threading.Lock()
+
+class SessionStore:
+    """In-memory sessions, evicting the least recently used beyond max_sessions"""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> ConversationSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ConversationSession()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+# Knowledge retrieval: "chroma" queries the Chroma collection, "hybrid" the in-process
+# memory-mapped dense + BM25 index written by init_data.py
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma")
+KNOWLEDGE_INDEX_PATH = os.getenv("KNOWLEDGE_INDEX_PATH", "./data/knowledge_index")
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "50"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
 # In-memory session storage
-conversations = {}
+conversations = SessionStore(SESSION_MAX_COUNT)
 
 class Product(BaseModel):
     id: int
@@ -58,6 +325,26 @@ class SearchResponse(BaseModel):
     follow_up_question: Optional[str] = None
     session_id: str
 
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+
+class ProductBatchResponse(BaseModel):
+    products: List[Product]
+    missing: List[int] = []
+
+class SearchBatchRequest(BaseModel):
+    queries: List[str]
+    conversation_history: List[Dict[str, str]] = []
+
+class SearchBatchItem(BaseModel):
+    query: str
+    response: Optional[SearchResponse] = None
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+
+class SearchBatchResponse(BaseModel):
+    results: List[SearchBatchItem]
+
 class AskRequest(BaseModel):
     question: str
     product_id: Optional[int] = None
@@ -68,131 +355,840 @@ class AskResponse(BaseModel):
     citations: List[str] = []
     session_id: str
 
+# LLM configuration
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+# Optional pool of Ollama servers as "url|model|weight" entries separated by commas;
+# model and weight may be omitted. Defaults to OLLAMA_BASE_URL with OLLAMA_MODEL.
+OLLAMA_ENDPOINTS = os.getenv("OLLAMA_ENDPOINTS", "")
+OLLAMA_ROUTING = os.getenv("OLLAMA_ROUTING", "least_outstanding")  # or "latency"
+OLLAMA_MAX_ATTEMPTS = int(os.getenv("OLLAMA_MAX_ATTEMPTS", "2"))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "100"))
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Startup warm-up
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_QUERY_LOG = os.getenv("WARMUP_QUERY_LOG", "../backend.log")
+WARMUP_TOP_QUERIES = int(os.getenv("WARMUP_TOP_QUERIES", "20"))
+
+# LLM scheduling: concurrency cap, queue cap and max queue time per priority class
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUTS = {
+    "interactive": float(os.getenv("LLM_QUEUE_TIMEOUT_INTERACTIVE", "30")),
+    "intent": float(os.getenv("LLM_QUEUE_TIMEOUT_INTENT", "10")),
+    "optional": float(os.getenv("LLM_QUEUE_TIMEOUT_OPTIONAL", "0"))
+}
+
+# Health probe configuration
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2"))
+
+# Search-box suggestions: results per request and weighting
+SUGGEST_LIMIT = int(os.getenv("SUGGEST_LIMIT", "8"))
+SUGGEST_MARGIN_WEIGHT = float(os.getenv("SUGGEST_MARGIN_WEIGHT", "0.5"))
+SUGGEST_POPULARITY_WEIGHT = float(os.getenv("SUGGEST_POPULARITY_WEIGHT", "0.5"))
+
+# Hot reload: how often the catalog watcher checks products.db for changes (0 disables it)
+CATALOG_WATCH_SECONDS = float(os.getenv("CATALOG_WATCH_SECONDS", "5"))
+# Largest catalog whose products are kept in each worker's snapshot; above it, product
+# reads go to the database and the snapshot keeps only categories and suggestions
+CATALOG_SNAPSHOT_MAX_PRODUCTS = int(os.getenv("CATALOG_SNAPSHOT_MAX_PRODUCTS", "100000"))
+
+# Bounded executors for blocking work: SQLite and Chroma calls run on the I/O pool,
+# embedding inference on the CPU pool so it cannot oversubscribe the cores
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "2"))
+# Sharded queries: enough workers for every I/O worker to query all shards at once,
+# so sharding raises the number of concurrent SQLite queries instead of capping it
+SHARD_POOL_WORKERS = int(os.getenv("SHARD_POOL_WORKERS", str(IO_POOL_WORKERS * CATALOG_SHARDS)))
+
+# Batch endpoints: items per request, and searches of one batch run at the same time
+PRODUCT_BATCH_MAX_IDS = int(os.getenv("PRODUCT_BATCH_MAX_IDS", "500"))
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "50"))
+SEARCH_BATCH_CONCURRENCY = int(os.getenv("SEARCH_BATCH_CONCURRENCY", "4"))
+
+def normalize_query(query: str) -> str:
+    """Lower-case a query and collapse whitespace so equivalent queries share a key"""
+    return " ".join((query or "").lower().split())
+
+def normalize_question(question: str) -> str:
+    """Key for precomputed answers: normalized text without trailing punctuation"""
+    return normalize_query(question).rstrip(" ?!.")
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into a single execution.
+
+    The first caller runs the function; callers that arrive while it is still in
+    flight wait for it and receive the same result or exception. Nothing is kept
+    after the call completes, so this only covers the window before any cache
+    could have been populated.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": in_flight}
+
+class LLMOverloadedError(Exception):
+    """Raised when the LLM scheduler sheds a call instead of queueing it"""
+
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"LLM is saturated, shed {priority} call")
+        self.priority = priority
+        self.retry_after = retry_after
+
+class LLMScheduler:
+    """Caps concurrent Ollama calls and admits waiting calls by priority.
+
+    Interactive answers go ahead of intent classification, which goes ahead of
+    optional work. Each class has a maximum queue time (zero means "only run if
+    a slot is free right now") and the queue itself is bounded, so bursts are
+    shed with LLMOverloadedError instead of piling up on the model.
+    """
+
+    PRIORITIES = ("interactive", "intent", "optional")
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeouts: Dict[str, float]):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.queue_timeouts = queue_timeouts
+        self.shed = Counter()
+        self.completed = Counter()
+        self._active = 0
+        self._waiting = []  # heap of (priority rank, arrival sequence)
+        self._sequence = itertools.count()
+        self._avg_service_time = 5.0
+        self._cond = threading.Condition()
+
+    def _retry_after(self) -> int:
+        backlog = self._active + len(self._waiting)
+        return max(1, math.ceil(backlog * self._avg_service_time / self.max_concurrency))
+
+    def _reject(self, priority: str):
+        self.shed[priority] += 1
+        raise LLMOverloadedError(priority, self._retry_after())
+
+    def _acquire(self, priority: str):
+        timeout = self.queue_timeouts.get(priority, 0)
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                return
+            if timeout <= 0 or len(self._waiting) >= self.max_queue:
+                self._reject(priority)
+
+            entry = (self.PRIORITIES.index(priority), next(self._sequence))
+            heapq.heappush(self._waiting, entry)
+            deadline = time.monotonic() + timeout
+            while self._waiting[0] != entry or self._active >= self.max_concurrency:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    # The head of the queue may have changed
+                    self._cond.notify_all()
+                    self._reject(priority)
+                self._cond.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            self._active += 1
+            self._cond.notify_all()
+
+    def _release(self, priority: str, elapsed: float):
+        with self._cond:
+            self._active -= 1
+            self.completed[priority] += 1
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def run(self, priority: str, fn, *args, **kwargs):
+        self._acquire(priority)
+        start = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._release(priority, time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            queued = Counter(self.PRIORITIES[rank] for rank, _ in self._waiting)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": {priority: queued.get(priority, 0) for priority in self.PRIORITIES},
+                "completed": dict(self.completed),
+                "shed": dict(self.shed),
+                "avg_service_time_s": round(self._avg_service_time, 3)
+            }
+
+class BlockingPool:
+    """Fixed-size thread pool for one kind of blocking work, reporting its queue depth.
+
+    Handlers await run() so the event loop stays free; code that is already on
+    another thread uses call(). Calls made from one of the pool's own workers run
+    inline, so nested use can never wait on itself.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.completed = 0
+        self.peak_queued = 0
+        self._queued = 0
+        self._active = 0
+        self._thread_prefix = f"{name}-pool"
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self._thread_prefix)
+        self._lock = threading.Lock()
+
+    def _execute(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        with self._lock:
+            self._queued += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+        future = self._executor.submit(self._execute, with_request_context(fn), args, kwargs)
+        future.add_done_callback(self._discard_cancelled)
+        return future
+
+    def _discard_cancelled(self, future: Future):
+        # A call cancelled before it started never reaches _execute to leave the queue
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def call(self, fn, *args, **kwargs):
+        if threading.current_thread().name.startswith(self._thread_prefix):
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed
+            }
+
+io_pool = BlockingPool("io", IO_POOL_WORKERS)
+cpu_pool = BlockingPool("cpu", CPU_POOL_WORKERS)
+# Scatter-gather queries across catalog shards
+shard_pool = BlockingPool("shard", SHARD_POOL_WORKERS)
+
+def embed_query(text: str) -> np.ndarray:
+    """Normalized embedding of a query, computed on the CPU pool"""
+    return cpu_pool.call(embedding_model.encode, text, normalize_embeddings=True)
+
+llm_scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUTS)
+
+# Shared by every OllamaService / ProductService instance
+llm_flight = SingleFlight("llm_generate")
+search_flight = SingleFlight("search_products")
+intent_flight = SingleFlight("query_intent")
+
+# Returned in place of a generation when every Ollama endpoint fails
+LLM_ERROR_MESSAGE = "I'm having trouble processing your request right now. Please try again."
+
+class OllamaEndpoint:
+    def __init__(self, url: str, model: str = OLLAMA_MODEL, weight: float = 1.0):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.weight = weight if weight > 0 else 1.0
+        self.outstanding = 0
+        self.latency = None  # moving average of successful calls, in seconds
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def list_models(self, timeout: float = HEALTH_PROBE_TIMEOUT) -> List[str]:
+        """Return the names of the models available on this Ollama server"""
+        response = requests.get(f"{self.url}/api/tags", timeout=timeout)
+        response.raise_for_status()
+        return [model["name"] for model in response.json().get("models", [])]
+
+    def stats(self) -> Dict:
+        return {
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "failures": self.failures
+        }
+
+def parse_ollama_endpoints(spec: str) -> List[OllamaEndpoint]:
+    endpoints = []
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        parts = [part.strip() for part in entry.split("|")]
+        model = parts[1] if len(parts) > 1 and parts[1] else OLLAMA_MODEL
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        endpoints.append(OllamaEndpoint(parts[0], model, weight))
+    return endpoints or [OllamaEndpoint(OLLAMA_BASE_URL, OLLAMA_MODEL)]
+
+class OllamaRouter:
+    """Spreads generations over a pool of Ollama servers.
+
+    Endpoints are picked by fewest outstanding requests (or lowest average
+    latency) relative to their weight. A failing endpoint is ejected for
+    OLLAMA_EJECT_SECONDS and the prompt is retried on another one; ejected
+    endpoints come back once re-probed healthy or once the ejection expires.
+    """
+
+    def __init__(self, endpoints: List[OllamaEndpoint], strategy: str = OLLAMA_ROUTING,
+                 max_attempts: int = OLLAMA_MAX_ATTEMPTS, eject_seconds: float = OLLAMA_EJECT_SECONDS):
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.max_attempts = max(1, max_attempts)
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+
+    def _score(self, endpoint: OllamaEndpoint) -> float:
+        load = endpoint.outstanding + 1
+        if self.strategy == "latency" and endpoint.latency is not None:
+            return endpoint.latency * load / endpoint.weight
+        return load / endpoint.weight
+
+    def _pick(self, exclude: List[OllamaEndpoint]) -> Optional[OllamaEndpoint]:
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            # Prefer healthy endpoints, but an ejected one beats failing outright
+            healthy = [e for e in candidates if e.healthy]
+            if healthy or candidates:
+                endpoint = min(healthy or candidates, key=self._score)
+                endpoint.outstanding += 1
+                return endpoint
+            return None
+
+    def _finish(self, endpoint: OllamaEndpoint, elapsed: Optional[float]):
+        with self._lock:
+            endpoint.outstanding -= 1
+            if elapsed is None:
+                endpoint.failures += 1
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            else:
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+                endpoint.latency = elapsed if endpoint.latency is None else 0.8 * endpoint.latency + 0.2 * elapsed
+
+    def post_generate(self, payload: Dict, endpoint: OllamaEndpoint = None,
+                      failover: bool = True) -> Tuple[OllamaEndpoint, Dict]:
+        """POST /api/generate, retrying on another endpoint if one fails.
+
+        The payload is sent without a model; each endpoint fills in its own.
+        Passing an endpoint pins the first attempt to it, and failover=False
+        disables retries elsewhere (e.g. for payloads carrying a model context).
+        """
+        tried = []
+        last_error = None
+        attempts = min(self.max_attempts, len(self.endpoints)) if failover else 1
+        for attempt in range(attempts):
+            if endpoint is not None and attempt == 0 and endpoint in self.endpoints:
+                with self._lock:
+                    endpoint.outstanding += 1
+                current = endpoint
+            else:
+                current = self._pick(tried)
+            if current is None:
+                break
+            tried.append(current)
+            start = time.monotonic()
+            try:
+                response = requests.post(
+                    f"{current.url}/api/generate",
+                    json={**payload, "model": current.model},
+                    timeout=OLLAMA_TIMEOUT
+                )
+                response.raise_for_status()
+                result = response.json()
+            except Exception as e:
+                self._finish(current, None)
+                logger.warning(f"Ollama endpoint {current.url} failed: {e}")
+                last_error = e
+                continue
+            self._finish(current, time.monotonic() - start)
+            return current, result
+        raise last_error or RuntimeError("No Ollama endpoint available")
+
+    def load_models(self, keep_alive: str = OLLAMA_KEEP_ALIVE) -> List[str]:
+        """Ask every endpoint to load its model into memory, returning those that did"""
+        loaded = []
+        for endpoint in self.endpoints:
+            try:
+                # A generate request without a prompt only loads the model
+                response = requests.post(
+                    f"{endpoint.url}/api/generate",
+                    json={"model": endpoint.model, "keep_alive": keep_alive},
+                    timeout=OLLAMA_TIMEOUT
+                )
+                response.raise_for_status()
+                loaded.append(endpoint.url)
+            except Exception as e:
+                logger.warning(f"Could not load {endpoint.model} on {endpoint.url}: {e}")
+        return loaded
+
+    def probe(self) -> List[Dict]:
+        """Check every endpoint's model list, restoring or ejecting it accordingly"""
+        results = []
+        for endpoint in self.endpoints:
+            try:
+                available = endpoint.model in endpoint.list_models()
+                error = None if available else f"Model {endpoint.model} is not available"
+            except Exception as e:
+                available, error = False, str(e)
+            with self._lock:
+                if available:
+                    endpoint.ejected_until = 0.0
+                elif endpoint.healthy:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            result = endpoint.stats()
+            if error:
+                result["error"] = error
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"strategy": self.strategy, "endpoints": [e.stats() for e in self.endpoints]}
+
+ollama_router = OllamaRouter(parse_ollama_endpoints(OLLAMA_ENDPOINTS))
+
 class OllamaService:
-    def __init__(self, base_url: str = "http://localhost:11434"):
-        self.base_url = base_url
-        self.model = "llama3.1:8b"
+    def __init__(self, base_url: str = None):
+        # An explicit base_url gets its own single-endpoint router; otherwise the shared pool is used
+        self.router = OllamaRouter([OllamaEndpoint(base_url)]) if base_url else ollama_router
     
-    def generate(self, prompt: str, max_tokens: int = 500) -> str:
+    @staticmethod
+    def _payload(prompt: str, max_tokens: int) -> Dict:
+        return {
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {
+                "temperature": 0.7,
+                "max_tokens": max_tokens
+            }
+        }
+    
+    def _complete(self, prompt: str, max_tokens: int, priority: str) -> Tuple[OllamaEndpoint, Dict]:
+        # Identical prompts in flight at the same time share one generation
+        key = (id(self.router), prompt, max_tokens)
+        return llm_flight.do(key, llm_scheduler.run, priority, self.router.post_generate,
+                             self._payload(prompt, max_tokens))
+    
+    def generate(self, prompt: str, max_tokens: int = 500, priority: str = "interactive") -> str:
+        """Generate a completion; raises LLMOverloadedError if the call is shed"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "max_tokens": max_tokens
-                    }
-                },
-                timeout=100
-            )
-            response.raise_for_status()
-            return response.json()["response"].strip()
+            _, result = self._complete(prompt, max_tokens, priority)
+            return result["response"].strip()
+        except LLMOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Ollama API error: {e}")
+            return LLM_ERROR_MESSAGE
+    
+    def generate_in_session(self, session: ConversationSession, stream: str, full_prompt: str,
+                            turn_prompt: str, max_tokens: int = 500, priority: str = "interactive") -> str:
+        """Generate within a session, continuing from the model state of its previous turn.
+
+        The first turn of a stream (or one whose context has grown past
+        SESSION_CONTEXT_TOKENS) sends full_prompt; later turns send only
+        turn_prompt together with the context Ollama returned last time, so the
+        model does not re-prefill instructions and history.
+        """
+        with session.lock:
+            endpoint, context = session.llm_contexts.get(stream, (None, None))
+        
+        if context and endpoint in self.router.endpoints and len(context) < SESSION_CONTEXT_TOKENS:
+            payload = self._payload(turn_prompt, max_tokens)
+            payload["context"] = context
+            try:
+                endpoint, result = llm_scheduler.run(priority, self.router.post_generate,
+                                                     payload, endpoint, False)
+            except LLMOverloadedError:
+                raise
+            except Exception as e:
+                # The context only makes sense on its own endpoint; start over elsewhere
+                logger.warning(f"Continuing session context failed, re-sending full prompt: {e}")
+            else:
+                with session.lock:
+                    session.llm_contexts[stream] = (endpoint, result.get("context"))
+                return result["response"].strip()
+        
+        try:
+            endpoint, result = self._complete(full_prompt, max_tokens, priority)
+        except LLMOverloadedError:
+            raise
         except Exception as e:
             logger.error(f"Ollama API error: {e}")
-            return "I'm having trouble processing your request right now. Please try again."
+            return LLM_ERROR_MESSAGE
+        with session.lock:
+            session.llm_contexts[stream] = (endpoint, result.get("context"))
+        return result["response"].strip()
+
+# Search ranking: blend of lexical relevance and margin, both scaled to [0, 1]
+SEARCH_RELEVANCE_WEIGHT = float(os.getenv("SEARCH_RELEVANCE_WEIGHT", "0.7"))
+SEARCH_MARGIN_WEIGHT = float(os.getenv("SEARCH_MARGIN_WEIGHT", "0.3"))
+SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", "12"))
+# Upper bound on rows a single search pulls from SQLite for ranking
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "5000"))
+# Memory cap of the search result cache (0 disables it)
+SEARCH_CACHE_MAX_MB = float(os.getenv("SEARCH_CACHE_MAX_MB", "16"))
+SEARCH_FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "benefits": 1.5,
+    "ingredients": 1.5,
+    "skin_type": 1.0,
+    "description": 1.0
+}
+
+# Handle special search terms and common mappings
+SPECIAL_TERM_MAPPINGS = {
+    # Singular/Plural forms
+    "serum": "serum",
+    "serums": "serum",
+    "cleanser": "cleanser",
+    "cleansers": "cleanser",
+    "moisturizer": "moisturizer",
+    "moisturizers": "moisturizer",
+    "cream": "cream",
+    "creams": "cream",
+    "mask": "mask",
+    "masks": "mask",
+    "toner": "toner",
+    "toners": "toner",
+    
+    # Common descriptive terms
+    "anti-aging": "anti-aging",
+    "antiaging": "anti-aging",
+    "anti aging": "anti-aging",
+    "hydrating": "hydration",
+    "hydrate": "hydration",
+    "acne": "acne",
+    "sensitive": "sensitive"
+}
+
+def expand_search_terms(query: str) -> List[str]:
+    """Words of a query, each followed by its mapped term if it has a different one"""
+    search_terms = []
+    for term in (query or "").lower().split():
+        search_terms.append(term)
+        mapped_term = SPECIAL_TERM_MAPPINGS.get(term)
+        if mapped_term and mapped_term != term:
+            search_terms.append(mapped_term)
+    return search_terms
+
+def active_filters(filters: Optional[Dict]) -> Dict:
+    """The filters search_products actually applies"""
+    return {key: value for key, value in (filters or {}).items() if key in ("category", "skin_type") and value}
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    span = values.max() - values.min()
+    return (values - values.min()) / span if span > 0 else np.zeros_like(values)
+
+def rank_search_rows(rows: List[sqlite3.Row], terms: List[str], k: Optional[int] = None) -> List[sqlite3.Row]:
+    """Order candidate rows by a weighted blend of term relevance and margin, keeping the top k.
+
+    Relevance counts which search terms occur in which fields (weighted by
+    SEARCH_FIELD_WEIGHTS); ties fall back to margin, so a query whose candidates
+    all match equally is ordered exactly as before.
+    """
+    if not rows:
+        return []
+    margins = np.fromiter((row["margin"] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    relevance = np.zeros(len(rows))
+    for field, weight in SEARCH_FIELD_WEIGHTS.items():
+        column = np.array([(row[field] or "").lower() for row in rows], dtype=str)
+        for term in terms:
+            relevance += weight * (np.char.find(column, term) >= 0)
+    scores = SEARCH_RELEVANCE_WEIGHT * _scale(relevance) + SEARCH_MARGIN_WEIGHT * _scale(margins)
+
+    if k is not None and k < len(rows):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(rows))
+    # lexsort sorts by the last key first: score, then margin
+    order = top[np.lexsort((-margins[top], -scores[top]))]
+    return [rows[i] for i in order]
+
+class SearchResultCache:
+    """LRU cache of search results as ordered product ids, capped by their estimated memory use.
+
+    Keys start with the catalog version, and setting a new version drops every
+    older entry. Empty results and results found through the RAG or LLM
+    fallbacks are cached like any other, so the fallback chain runs at most once
+    per query and catalog version.
+    """
+
+    # Rough per-entry cost of the OrderedDict slot and key tuple, plus each int in the id tuple
+    ENTRY_OVERHEAD = 200
+    BYTES_PER_ID = 36
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (product ids, estimated bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _size(self, key: Tuple, ids: Tuple[int, ...]) -> int:
+        return (self.ENTRY_OVERHEAD + sum(sys.getsizeof(part) for part in key)
+                + sys.getsizeof(ids) + self.BYTES_PER_ID * len(ids))
+
+    def get(self, key: Tuple) -> Optional[Tuple[int, ...]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, ids: Tuple[int, ...]):
+        size = self._size(key, ids)
+        with self._lock:
+            # A search that started before a reload finished after it
+            if key[0] != self.version or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (ids, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def set_version(self, version: int):
+        with self._lock:
+            self.version = version
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+search_cache = SearchResultCache(int(SEARCH_CACHE_MAX_MB * 1024 * 1024))
 
 class ProductService:
     def __init__(self):
         self.db_path = "./data/products.db"
+        # The products table lives in db_path, or is split across shard files (CATALOG_SHARDS)
+        self.shard_paths = shard_paths(self.db_path)
         self.ollama_service = OllamaService()
-        self.rag_service = RAGService()
+        self.rag_service = create_rag_service()
     
-    def get_all_products(self) -> List[Product]:
-        conn = sqlite3.connect(self.db_path)
+    def _query(self, path: str, sql: str, params=()) -> List[sqlite3.Row]:
+        conn = sqlite3.connect(path)
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM products")
-        rows = cursor.fetchall()
-        conn.close()
-        
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+    
+    def _scatter(self, sql: str, params=()) -> List[List[sqlite3.Row]]:
+        """Run a query on every shard concurrently; one list of rows per shard"""
+        if len(self.shard_paths) == 1:
+            return [self._query(self.shard_paths[0], sql, params)]
+        futures = [shard_pool.submit(self._query, path, sql, params) for path in self.shard_paths]
+        return [future.result() for future in futures]
+    
+    def _select_by_margin(self, sql: str, params=(), limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Rows of a query ending in ORDER BY margin DESC, merged across shards in that order"""
+        results = self._scatter(sql, params)
+        if len(results) == 1:
+            return results[0][:limit]
+        return list(itertools.islice(heapq.merge(*results, key=lambda row: -row["margin"]), limit))
+    
+    def _select_all(self, sql: str, params=()) -> List[sqlite3.Row]:
+        rows = [row for shard_rows in self._scatter(sql, params) for row in shard_rows]
+        if len(self.shard_paths) > 1:
+            rows.sort(key=lambda row: row["id"])
+        return rows
+    
+    def warm_tables(self) -> int:
+        """Read every shard's products table into the page cache without building rows; returns the product count"""
+        counts = self._scatter("SELECT COUNT(*) FROM products")
+        # The margin-ordered scan that listings and search candidates use
+        self._select_by_margin("SELECT id, margin FROM products ORDER BY margin DESC LIMIT ?",
+                               (SEARCH_RESULT_LIMIT,), SEARCH_RESULT_LIMIT)
+        return sum(rows[0][0] for rows in counts)
+    
+    def get_all_products(self) -> List[Product]:
+        rows = self._select_all("SELECT * FROM products")
         return [Product(**dict(row)) for row in rows]
     
     def get_products_by_category(self, category: str) -> List[Product]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM products WHERE category = ?", (category,))
-        rows = cursor.fetchall()
-        conn.close()
-        
+        rows = self._select_all("SELECT * FROM products WHERE category = ?", (category,))
         return [Product(**dict(row)) for row in rows]
     
     def get_product_by_id(self, product_id: int) -> Optional[Product]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Ids encode their shard, so only the owning file is opened
+        rows = self._query(self.shard_paths[shard_index(product_id)],
+                           "SELECT * FROM products WHERE id = ?", (product_id,))
+        return Product(**dict(rows[0])) if rows else None
+    
+    def get_products_by_ids(self, product_ids: List[int]) -> List[Product]:
+        """Products for many ids with one connection per shard, in request order; unknown ids are skipped"""
+        unique_ids = list(dict.fromkeys(product_ids))
+        ids_by_shard = {}
+        for product_id in unique_ids:
+            ids_by_shard.setdefault(shard_index(product_id), []).append(product_id)
         
-        cursor.execute("SELECT * FROM products WHERE id = ?", (product_id,))
-        row = cursor.fetchone()
-        conn.close()
+        def fetch(path, ids):
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = []
+                # Stay well below SQLite's bound parameter limit
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    rows.extend(conn.execute(
+                        f"SELECT * FROM products WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall())
+                return rows
+            finally:
+                conn.close()
+        
+        if len(ids_by_shard) <= 1:
+            results = [fetch(self.shard_paths[shard], ids) for shard, ids in ids_by_shard.items()]
+        else:
+            futures = [shard_pool.submit(fetch, self.shard_paths[shard], ids) for shard, ids in ids_by_shard.items()]
+            results = [future.result() for future in futures]
+        rows = {row["id"]: row for shard_rows in results for row in shard_rows}
         
-        return Product(**dict(row)) if row else None
+        return [Product(**dict(rows[product_id])) for product_id in unique_ids if product_id in rows]
     
-    def search_products(self, query: str, filters: Dict = None) -> List[Product]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    def search_products(self, query: str, filters: Dict = None, limit: Optional[int] = None,
+                        fallbacks: bool = True) -> List[Product]:
+        """Products matching the query, best first; only the top `limit` are materialized.
+
+        With fallbacks=False only the lexical match runs, without the RAG and LLM
+        alternatives for queries that match nothing.
+        """
+        # Searches with the same terms (in any order) and the same effective filters return the
+        # same ranking, so they share a cache entry for the current catalog version
+        filters_key = {key: str(value).lower() for key, value in active_filters(filters).items()}
+        key = (search_cache.version, tuple(sorted(expand_search_terms(query))),
+               json.dumps(filters_key, sort_keys=True), limit, fallbacks)
+        if search_cache.max_bytes > 0:
+            ids = search_cache.get(key)
+            if ids is not None:
+                return self.get_products_by_ids(list(ids))
+        
+        # Concurrent identical searches share one run of the full fallback chain
+        return search_flight.do(key, self._search_and_cache, key, query, filters, limit, fallbacks)
+    
+    def _search_and_cache(self, key: Tuple, query: str, filters: Optional[Dict], limit: Optional[int],
+                          fallbacks: bool) -> List[Product]:
+        products, complete = self._search_products(query, filters, limit, fallbacks)
+        if complete and search_cache.max_bytes > 0:
+            search_cache.put(key, tuple(product.id for product in products))
+        return products
+    
+    def _search_products(self, query: str, filters: Dict = None, limit: Optional[int] = None,
+                         fallbacks: bool = True) -> Tuple[List[Product], bool]:
+        """Ranked products, and whether every step that was attempted completed.
+
+        A fallback that failed or was shed (an unreachable store, a saturated LLM)
+        makes the result incomplete, so it is not cached and the next search tries again.
+        """
+        complete = True
+        
+        # Every query below ends in ORDER BY margin DESC, so each shard's rows can be
+        # merged into the same order a single database would return
         
         # Handle empty query
         if not query or query.strip() == "":
             # Return all products if query is empty
-            cursor.execute("SELECT * FROM products ORDER BY margin DESC")
-            rows = cursor.fetchall()
-            conn.close()
-            return [Product(**dict(row)) for row in rows]
+            rows = self._select_by_margin("SELECT * FROM products ORDER BY margin DESC LIMIT ?",
+                                          (limit if limit else -1,), limit)
+            return [Product(**dict(row)) for row in rows], complete
         
         # Pre-process the search query
         query_lower = query.lower()
         
-        # Handle special search terms and common mappings
-        special_term_mappings = {
-            # Singular/Plural forms
-            "serum": "serum",
-            "serums": "serum",
-            "cleanser": "cleanser",
-            "cleansers": "cleanser",
-            "moisturizer": "moisturizer",
-            "moisturizers": "moisturizer",
-            "cream": "cream",
-            "creams": "cream",
-            "mask": "mask",
-            "masks": "mask",
-            "toner": "toner",
-            "toners": "toner",
-            
-            # Common descriptive terms
-            "anti-aging": "anti-aging",
-            "antiaging": "anti-aging",
-            "anti aging": "anti-aging",
-            "hydrating": "hydration",
-            "hydrate": "hydration",
-            "acne": "acne",
-            "sensitive": "sensitive"
-        }
-        
-        # Check for exact category matches first
-        cursor.execute("SELECT DISTINCT category FROM products")
-        all_categories = [row[0].lower() for row in cursor.fetchall()]
-        
-        # Split the query into words for flexible matching
+        # Split the query into words for flexible matching, with special mappings
         original_terms = query_lower.split()
-        search_terms = []
-        
-        # Process search terms with special mappings
-        for term in original_terms:
-            # Add the original term
-            search_terms.append(term)
-            
-            # Add mapped terms if they exist
-            if term in special_term_mappings:
-                mapped_term = special_term_mappings[term]
-                if mapped_term != term:
-                    search_terms.append(mapped_term)
+        search_terms = expand_search_terms(query)
         
         # Build search query with more flexible matching
         conditions = []
@@ -206,7 +1202,7 @@ class ProductService:
         # Combine conditions with OR for more flexible matching
         base_query = f"""
         SELECT * FROM products 
-        WHERE {" OR ".join(conditions)}
+        WHERE ({" OR ".join(conditions)})
         """
         
         # Apply filters if provided
@@ -218,14 +1214,14 @@ class ProductService:
                 base_query += " AND LOWER(skin_type) LIKE LOWER(?)"
                 params.append(f"%{filters['skin_type']}%")
         
-        # Order by margin (business logic)
-        base_query += " ORDER BY margin DESC"
+        # Order by margin (business logic); if the candidate cap applies, the highest margins are kept
+        base_query += " ORDER BY margin DESC LIMIT ?"
+        params.append(SEARCH_CANDIDATE_LIMIT)
         
-        cursor.execute(base_query, params)
-        rows = cursor.fetchall()
+        rows = self._select_by_margin(base_query, params, SEARCH_CANDIDATE_LIMIT)
         
         # If no results found with the initial search, try semantic search with the RAG system first
-        if not rows and hasattr(self, 'rag_service'):
+        if not rows and fallbacks and hasattr(self, 'rag_service'):
             try:
                 # First, try to use RAG to find related concepts
                 logger.info(f"Using RAG to find alternatives for query: {query}")
@@ -245,13 +1241,12 @@ class ProductService:
                     # Try using RAG-derived keywords
                     for keyword in potential_keywords[:8]:  # Try more keywords
                         pattern = f"%{keyword}%"
-                        cursor.execute("""SELECT * FROM products 
+                        rag_rows = self._select_by_margin("""SELECT * FROM products 
                                          WHERE LOWER(description) LIKE ? 
                                          OR LOWER(benefits) LIKE ? 
                                          OR LOWER(ingredients) LIKE ?
                                          ORDER BY margin DESC LIMIT 20""", 
-                                      [pattern, pattern, pattern])
-                        rag_rows = cursor.fetchall()
+                                      [pattern, pattern, pattern], 20)
                         
                         if rag_rows:
                             logger.info(f"Found products using RAG-derived keyword: {keyword}")
@@ -260,9 +1255,10 @@ class ProductService:
             except Exception as e:
                 # Log error but continue to next approach
                 logger.error(f"Error using RAG for search: {e}")
+                complete = False
         
         # If RAG didn't yield results, use Ollama LLM to generate alternative search terms
-        if not rows and hasattr(self, 'ollama_service'):
+        if not rows and fallbacks and hasattr(self, 'ollama_service'):
             try:
                 # Create a more specific prompt for the query
                 if 'anti-aging' in query_lower or 'anti aging' in query_lower or 'antiaging' in query_lower:
@@ -285,8 +1281,11 @@ class ProductService:
                 
                 # Get alternative search terms from LLM
                 logger.info(f"Using Ollama to generate alternatives for: {query}")
-                alt_terms_response = self.ollama_service.generate(prompt, max_tokens=150)
+                alt_terms_response = self.ollama_service.generate(prompt, max_tokens=150, priority="optional")
                 logger.info(f"Ollama response: {alt_terms_response}")
+                if alt_terms_response == LLM_ERROR_MESSAGE:
+                    # Every endpoint failed; try again on the next search instead of caching
+                    complete = False
                 
                 # Parse the response and clean up terms
                 alt_terms = [term.strip() for term in alt_terms_response.split(',')]
@@ -305,16 +1304,19 @@ class ProductService:
                         ORDER BY margin DESC
                         """
                         pattern = f"%{alt_term.lower()}%"
-                        cursor.execute(alt_query, [pattern, pattern, pattern, pattern, pattern])
-                        alt_rows = cursor.fetchall()
+                        alt_rows = self._select_by_margin(alt_query, [pattern, pattern, pattern, pattern, pattern])
                         
                         if alt_rows:
                             logger.info(f"Found products using LLM-suggested term: {alt_term}")
                             rows = alt_rows
                             break
+            except LLMOverloadedError:
+                logger.info(f"LLM saturated, skipping alternative search terms for: {query}")
+                complete = False
             except Exception as e:
                 # Log error but continue with default search behavior
                 logger.error(f"Error using LLM for alternative search terms: {e}")
+                complete = False
             
         # If all LLM and RAG approaches failed (or aren't available), fall back to fuzzy matching
         if not rows:
@@ -336,21 +1338,51 @@ class ProductService:
                 ORDER BY margin DESC
                 """
                 
-                cursor.execute(wildcard_query, wildcard_params)
-                rows = cursor.fetchall()
+                rows = self._select_by_margin(wildcard_query, wildcard_params)
         
-        conn.close()
-        return [Product(**dict(row)) for row in rows]
+        # Rank every candidate, but only build response objects for the ones returned
+        return [Product(**dict(row)) for row in rank_search_rows(rows, search_terms, limit)], complete
     
-    def get_categories(self) -> List[str]:
+    def get_precomputed_answer(self, product_id: int, question: str) -> Optional[Dict]:
+        """Answer precomputed for this product's current content and knowledge version, if any"""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT DISTINCT category FROM products")
-        categories = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        try:
+            # The product may live in a shard file, so its content hash is looked up separately
+            products = self._query(self.shard_paths[shard_index(product_id)],
+                                   "SELECT content_hash FROM products WHERE id = ?", (product_id,))
+            if not products or not products[0]["content_hash"]:
+                return None
+            row = conn.execute("""
+                SELECT a.answer, a.citations FROM precomputed_answers a
+                JOIN metadata m ON m.key = 'knowledge_version' AND m.value = a.knowledge_version
+                WHERE a.product_hash = ? AND a.question_key = ?
+            """, (products[0]["content_hash"], normalize_question(question))).fetchone()
+        except sqlite3.OperationalError:
+            # Database initialized before answers were precomputed
+            return None
+        finally:
+            conn.close()
         
-        return categories
+        return {"answer": row[0], "citations": json.loads(row[1])} if row else None
+    
+    def get_knowledge_links(self, product_id: int) -> List[str]:
+        """Ids of the knowledge chunks init_data.py linked to this product, best first"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                "SELECT chunk_id FROM product_knowledge WHERE product_id = ? ORDER BY score DESC",
+                (product_id,)
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Database initialized before products were linked to knowledge
+            return []
+        finally:
+            conn.close()
+        return [row[0] for row in rows]
+    
+    def get_categories(self) -> List[str]:
+        results = self._scatter("SELECT DISTINCT category FROM products")
+        return list(dict.fromkeys(row[0] for shard_rows in results for row in shard_rows))
 
 class RAGService:
     def __init__(self):
@@ -359,10 +1391,25 @@ class RAGService:
         except:
             self.collection = chroma_client.create_collection("skincare_knowledge")
     
+    def reload(self):
+        """Pick up a collection that init_data.py recreated"""
+        self.collection = chroma_client.get_or_create_collection("skincare_knowledge")
+    
+    def is_stale(self) -> bool:
+        """Whether the collection was replaced; init_data.py recreates it on every run, changed or not"""
+        try:
+            return chroma_client.get_collection("skincare_knowledge").id != self.collection.id
+        except Exception:
+            return True
+    
+    def count(self) -> int:
+        return self.collection.count()
+    
     def query_knowledge(self, query: str, n_results: int = 5) -> List[Dict]:
         try:
+            # Embedded with the shared model the collection was built with, on the CPU pool
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[embed_query(query).tolist()],
                 n_results=n_results
             )
             
@@ -378,41 +1425,237 @@ class RAGService:
         except Exception as e:
             logger.error(f"RAG query error: {e}")
             return []
+    
+    def query_chunks(self, query: str, chunk_ids: List[str], n_results: int = 5) -> List[Dict]:
+        """Rank only the given chunks (e.g. a product's knowledge links) against the query"""
+        try:
+            records = self.collection.get(ids=chunk_ids, include=["documents", "metadatas", "embeddings"])
+            if not records['ids']:
+                return []
+            # Chunks were embedded with the shared model by init_data.py, so a few dot products rank them
+            matrix = np.asarray(records['embeddings'], dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            similarities = matrix @ embed_query(query)
+            return [
+                {
+                    'content': records['documents'][i],
+                    'metadata': records['metadatas'][i] or {},
+                    'score': float(2 * similarities[i] - 1)  # 1 - squared L2 distance, as in query_knowledge
+                }
+                for i in np.argsort(-similarities)[:n_results]
+            ]
+        except Exception as e:
+            logger.error(f"RAG query error: {e}")
+            return []
+
+class HybridRAGService:
+    """Serves query_knowledge from an in-process KnowledgeIndex instead of Chroma.
+
+    Dense retrieval uses the shared MiniLM model (the same model as Chroma's
+    default embedding function) and is fused with BM25 so exact ingredient names
+    still match. The index is written by init_data.py; when it is missing it is
+    exported once from the Chroma collection.
+    """
+
+    def __init__(self, path: str = KNOWLEDGE_INDEX_PATH):
+        self.path = path
+        if not KnowledgeIndex.exists(path):
+            self._export_from_chroma()
+        self.index = KnowledgeIndex.load(path)
+        logger.info(f"Loaded knowledge index with {len(self.index)} chunks from {path}")
+    
+    def _export_from_chroma(self):
+        collection = chroma_client.get_or_create_collection("skincare_knowledge")
+        records = collection.get(include=["documents", "metadatas", "embeddings"])
+        KnowledgeIndex.build(self.path, records["documents"] or [], records["metadatas"] or [],
+                             records["embeddings"] or [], ids=records["ids"])
+    
+    def reload(self):
+        """Load a rewritten index; queries keep using the old one until it is ready"""
+        self.index = KnowledgeIndex.load(self.path)
+        logger.info(f"Reloaded knowledge index with {len(self.index)} chunks from {self.path}")
+    
+    def is_stale(self) -> bool:
+        # A rewritten index replaces the files rather than modifying them, so the mapped
+        # ones stay readable; only new content (a new knowledge version) calls for a reload
+        return False
+    
+    def count(self) -> int:
+        return len(self.index)
+    
+    def query_knowledge(self, query: str, n_results: int = 5) -> List[Dict]:
+        try:
+            query_embedding = embed_query(query)
+            return self.index.search(query, query_embedding, n_results=n_results,
+                                     candidates=RAG_CANDIDATES, rrf_k=RAG_RRF_K)
+        except Exception as e:
+            logger.error(f"RAG query error: {e}")
+            return []
+    
+    def query_chunks(self, query: str, chunk_ids: List[str], n_results: int = 5) -> List[Dict]:
+        try:
+            query_embedding = embed_query(query)
+            return self.index.search_ids(query_embedding, chunk_ids, n_results=n_results)
+        except Exception as e:
+            logger.error(f"RAG query error: {e}")
+            return []
+
+_rag_service = None
+
+def create_rag_service():
+    """Shared knowledge retrieval service for the backend selected by RAG_BACKEND"""
+    global _rag_service
+    if _rag_service is None:
+        _rag_service = HybridRAGService() if RAG_BACKEND == "hybrid" else RAGService()
+    return _rag_service
+
+def rank_knowledge(docs: List[Dict]) -> List[Dict]:
+    """Retrieved chunks best first: in fused order for hybrid results, by similarity otherwise"""
+    return sorted(docs, key=lambda doc: doc.get('rrf_score', doc.get('score', 0)), reverse=True)
+
+# Prompt token budgets per section
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "200"))
+PROMPT_PRODUCT_TOKENS = int(os.getenv("PROMPT_PRODUCT_TOKENS", "300"))
+PROMPT_KNOWLEDGE_TOKENS = int(os.getenv("PROMPT_KNOWLEDGE_TOKENS", "400"))
+# Optional Hugging Face tokenizer matching the served model, for exact token counts
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate a BPE token count: words and punctuation, plus a share for long words"""
+    return math.ceil(len(_TOKEN_PATTERN.findall(text)) * 1.25)
+
+def load_token_counter():
+    if PROMPT_TOKENIZER:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(PROMPT_TOKENIZER)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {PROMPT_TOKENIZER}, estimating tokens instead: {e}")
+    return estimate_tokens
+
+count_tokens = load_token_counter()
+
+def truncate_to_tokens(text: str, budget: int, counter=None) -> str:
+    """Cut text at a word boundary so it fits within budget tokens"""
+    counter = counter or count_tokens
+    if counter(text) <= budget:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if counter(" ".join(words[:middle]) + "...") <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + "..." if low else ""
+
+class PromptBuilder:
+    """Assembles an LLM prompt with a token budget per section.
+
+    The fixed instructions always come first so prompts share a stable prefix
+    that Ollama can reuse from its prompt cache. Variable sections follow, each
+    filled with snippets in order of importance until its budget runs out.
+    """
+
+    def __init__(self, instructions: str, counter=None):
+        self.instructions = textwrap.dedent(instructions).strip()
+        self.counter = counter or count_tokens
+        self.sections = []
+
+    def add_section(self, title: str, snippets: List[str], budget: int, keep: str = "first") -> "PromptBuilder":
+        """Add snippets ordered best first; keep="last" favours the end of the list (e.g. recent history)"""
+        ordered = list(snippets) if keep == "first" else list(reversed(snippets))
+        chosen = []
+        remaining = budget
+        for snippet in ordered:
+            snippet = " ".join(snippet.split())
+            if not snippet:
+                continue
+            if remaining <= 0:
+                break
+            snippet = truncate_to_tokens(snippet, remaining, self.counter)
+            if not snippet:
+                break
+            chosen.append(snippet)
+            remaining -= self.counter(snippet)
+        if keep != "first":
+            chosen.reverse()
+        if chosen:
+            self.sections.append(f"{title}:\n" + "\n".join(chosen))
+        return self
+
+    def build(self, tail: str) -> str:
+        parts = [self.instructions] + self.sections + [textwrap.dedent(tail).strip()]
+        return "\n\n".join(part for part in parts if part)
+
+INTENT_INSTRUCTIONS = """
+    Analyze the user query in a skincare product context.
+
+    Classify the intent as one of:
+    1. SPECIFIC_SEARCH - User wants specific products (has clear criteria)
+    2. VAGUE_SEARCH - User needs guidance (vague requirements)
+    3. QUESTION - User asking about product info/advice
+
+    Also determine what follow-up questions (if any) are needed.
+
+    Respond in JSON format:
+    {
+        "intent": "SPECIFIC_SEARCH|VAGUE_SEARCH|QUESTION",
+        "confidence": 0.8,
+        "needs_followup": true/false,
+        "suggested_followup": "question text or null",
+        "search_terms": ["extracted", "keywords"],
+        "filters": {"category": "optional", "skin_type": "optional"}
+    }
+"""
+
+ANSWER_INSTRUCTIONS = """
+    You are a skincare shopping assistant.
+    Provide a helpful, accurate answer based on the available information.
+    If referencing specific information, mention the source briefly.
+    Keep the response under 100 words and conversational.
+"""
 
 class ConversationalService:
     def __init__(self):
         self.ollama = OllamaService()
         self.product_service = ProductService()
-        self.rag_service = RAGService()
+        self.rag_service = create_rag_service()
     
-    def analyze_query_intent(self, query: str, history: List[Dict]) -> Dict:
+    def analyze_query_intent(self, query: str, history: List[Dict],
+                             session: ConversationSession = None) -> Dict:
         """Analyze if query needs follow-up questions or can be answered directly"""
         
-        prompt = f"""
-        Analyze this user query in a skincare product context:
-        Query: "{query}"
-        
-        Previous conversation: {json.dumps(history[-2:]) if history else "None"}
-        
-        Classify the intent as one of:
-        1. SPECIFIC_SEARCH - User wants specific products (has clear criteria)
-        2. VAGUE_SEARCH - User needs guidance (vague requirements)
-        3. QUESTION - User asking about product info/advice
-        
-        Also determine what follow-up questions (if any) are needed.
-        
-        Respond in JSON format:
-        {{
-            "intent": "SPECIFIC_SEARCH|VAGUE_SEARCH|QUESTION",
-            "confidence": 0.8,
-            "needs_followup": true/false,
-            "suggested_followup": "question text or null",
-            "search_terms": ["extracted", "keywords"],
-            "filters": {{"category": "optional", "skin_type": "optional"}}
-        }}
-        """
+        if session is not None and "intent" in session.llm_contexts:
+            # Continuing a session's model context is specific to that session
+            return self._analyze_query_intent(query, history, session)
+        key = (normalize_query(query), json.dumps(history[-2:] if history else None, sort_keys=True))
+        return intent_flight.do(key, self._analyze_query_intent, query, history, session)
+    
+    def _analyze_query_intent(self, query: str, history: List[Dict],
+                              session: ConversationSession = None) -> Dict:
+        turn_prompt = f'Query: "{query}"'
+        prompt = PromptBuilder(INTENT_INSTRUCTIONS).add_section(
+            "Previous conversation",
+            [f"{turn.get('role', 'user')}: {turn.get('content', '')}" for turn in (history or [])[-2:]],
+            PROMPT_HISTORY_TOKENS,
+            keep="last"
+        ).build(turn_prompt)
         
-        response = self.ollama.generate(prompt, max_tokens=300)
+        try:
+            if session is not None:
+                response = self.ollama.generate_in_session(session, "intent", prompt, turn_prompt,
+                                                           max_tokens=300, priority="intent")
+            else:
+                response = self.ollama.generate(prompt, max_tokens=300, priority="intent")
+        except LLMOverloadedError:
+            # Shed the classification and use the heuristic fallback below
+            logger.info(f"LLM saturated, using heuristic intent for: {query}")
+            response = ""
         try:
             return json.loads(response)
         except:
@@ -481,33 +1724,53 @@ class ConversationalService:
             else:
                 return generic_questions[1]  # Ask about skin concerns for more detailed queries
     
-    def process_search(self, request: SearchRequest) -> SearchResponse:
-        """Main search processing logic"""
+    def process_search(self, request: SearchRequest, session: ConversationSession = None) -> SearchResponse:
+        """Main search processing logic; pass a session to keep the turn out of the session store"""
         
         session_id = request.session_id or str(uuid.uuid4())
         
         # Store conversation history
-        if session_id not in conversations:
-            conversations[session_id] = []
-        
-        conversations[session_id].append({
+        if session is None:
+            session = conversations.get(session_id)
+        session.history.append({
             "role": "user",
             "content": request.query,
             "timestamp": datetime.now().isoformat()
         })
         
+        # Most intents search for the query's own words, so start that lexical search
+        # while the intent is analyzed instead of after it
+        speculative = io_pool.submit(self.product_service.search_products, request.query,
+                                     None, SEARCH_RESULT_LIMIT, False)
+        
         # Analyze query intent
-        intent_analysis = self.analyze_query_intent(request.query, request.conversation_history)
+        intent_analysis = self.analyze_query_intent(request.query, request.conversation_history, session)
         
-        # Search products
+        # Search products, reusing the speculative search if the intent asks for the same one
         search_terms = " ".join(intent_analysis.get("search_terms", [request.query]))
-        products = self.product_service.search_products(search_terms, intent_analysis.get("filters"))
+        filters = intent_analysis.get("filters")
+        products = None
+        if (not active_filters(filters)
+                and sorted(expand_search_terms(search_terms)) == sorted(expand_search_terms(request.query))):
+            try:
+                products = speculative.result()
+            except Exception as e:
+                logger.error(f"Speculative search failed: {e}")
+        else:
+            speculative.cancel()
+        
+        if products:
+            speculative_search_stats["used"] += 1
+        else:
+            # A different search, or one that needs the fallback chain for zero matches
+            speculative_search_stats["discarded"] += 1
+            products = self.product_service.search_products(search_terms, filters, limit=SEARCH_RESULT_LIMIT)
         
         # Determine response type
         if intent_analysis.get("intent") == "QUESTION":
             # Handle as Q&A
-            answer = self.answer_question(request.query, products[:5])
-            conversations[session_id].append({
+            answer = self.answer_question(request.query, products[:5], session)
+            session.history.append({
                 "role": "assistant",
                 "content": answer,
                 "timestamp": datetime.now().isoformat()
@@ -530,7 +1793,7 @@ class ConversationalService:
         else:
             message = "I couldn't find products matching your request. Could you try a different search term?"
         
-        conversations[session_id].append({
+        session.history.append({
             "role": "assistant",
             "content": message,
             "timestamp": datetime.now().isoformat()
@@ -539,7 +1802,7 @@ class ConversationalService:
         return SearchResponse(
             response_type="results",
             message=message,
-            products=products[:12],  # Limit results
+            products=products[:SEARCH_RESULT_LIMIT],  # Limit results
             follow_up_question=follow_up,
             session_id=session_id
         )
@@ -577,53 +1840,502 @@ class ConversationalService:
         else:
             return f"Great choice! I found {len(products)} {category_text}{skin_type_text} for you to explore."
     
-    def answer_question(self, question: str, relevant_products: List[Product] = None) -> str:
+    def retrieve_knowledge(self, question: str, product_id: Optional[int] = None,
+                           n_results: int = 3) -> List[Dict]:
+        """Knowledge for a question; product-scoped questions only rank the product's linked chunks"""
+        if product_id is not None:
+            chunk_ids = self.product_service.get_knowledge_links(product_id)
+            if chunk_ids:
+                return self.rag_service.query_chunks(question, chunk_ids, n_results=n_results)
+        return self.rag_service.query_knowledge(question, n_results=n_results)
+    
+    def get_citations(self, question: str, rag_docs: Optional[List[Dict]] = None) -> List[str]:
+        """Short excerpts of the knowledge that closely matches a question"""
+        if rag_docs is None:
+            rag_docs = self.rag_service.query_knowledge(question, n_results=2)
+        rag_docs = rank_knowledge(rag_docs)[:2]
+        return [doc['content'][:100] + "..." for doc in rag_docs if doc['score'] > 0.7]
+    
+    def answer_question(self, question: str, relevant_products: List[Product] = None,
+                        session: ConversationSession = None, rag_docs: Optional[List[Dict]] = None) -> str:
         """Answer questions using RAG and product data"""
         
-        # Get relevant knowledge from RAG
-        rag_docs = self.rag_service.query_knowledge(question, n_results=3)
-        
-        # Prepare context
-        rag_context = "\n".join([doc['content'] for doc in rag_docs[:2]])
-        product_context = ""
-        
-        if relevant_products:
-            product_context = "\n".join([
-                f"- {p.name}: {p.description} (Benefits: {p.benefits})"
-                for p in relevant_products[:3]
-            ])
-        
-        prompt = f"""
-        User question: "{question}"
-        
-        Relevant product information:
-        {product_context}
+        # Get relevant knowledge from RAG, unless the caller already retrieved it
+        if rag_docs is None:
+            rag_docs = self.rag_service.query_knowledge(question, n_results=3)
         
-        Additional knowledge:
-        {rag_context}
+        # Best-ranked knowledge first, so the budget drops the weakest snippets
+        rag_docs = rank_knowledge(rag_docs)
         
-        Provide a helpful, accurate answer based on the available information.
-        If referencing specific information, mention the source briefly.
-        Keep the response under 100 words and conversational.
-        
-        Answer:
-        """
+        def build(instructions: str) -> str:
+            builder = PromptBuilder(instructions)
+            if relevant_products:
+                builder.add_section(
+                    "Relevant product information",
+                    [f"- {p.name}: {p.description} (Benefits: {p.benefits})" for p in relevant_products[:3]],
+                    PROMPT_PRODUCT_TOKENS
+                )
+            builder.add_section(
+                "Additional knowledge",
+                [f"[{(doc.get('metadata') or {}).get('source', 'knowledge')}] {doc['content']}" for doc in rag_docs],
+                PROMPT_KNOWLEDGE_TOKENS
+            )
+            return builder.build(f'User question: "{question}"\n\nAnswer:')
         
-        return self.ollama.generate(prompt, max_tokens=150)
+        prompt = build(ANSWER_INSTRUCTIONS)
+        if session is not None:
+            # Later turns only carry this question's context; the instructions are already in the model state
+            return self.ollama.generate_in_session(session, "answer", prompt, build(""),
+                                                   max_tokens=150, priority="interactive")
+        return self.ollama.generate(prompt, max_tokens=150, priority="interactive")
+
+class HealthProber:
+    """Checks dependencies on a background thread and caches the result.
+
+    Probes only read the cached status, so liveness and readiness checks never
+    touch the model or the stores themselves.
+    """
+
+    def __init__(self, db_path: str, rag_service: RAGService, ollama: OllamaService,
+                 interval: float = HEALTH_PROBE_INTERVAL):
+        self.db_path = db_path
+        self.rag_service = rag_service
+        self.ollama = ollama
+        self.interval = interval
+        self.status = {
+            "ready": False,
+            "checked_at": None,
+            "services": {
+                "ollama": {"status": "unknown"},
+                "database": {"status": "unknown"},
+                "vector_store": {"status": "unknown"}
+            }
+        }
+        self.warmup = {"status": "pending"}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def is_ready(self) -> bool:
+        return self.status["ready"] and self.warmup["status"] in ("complete", "disabled")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while True:
+            self.probe()
+            if self._stop_event.wait(self.interval):
+                break
+
+    def _check(self, check) -> Dict:
+        start = time.perf_counter()
+        try:
+            detail = check()
+            result = {"status": "healthy"}
+            if detail:
+                result.update(detail)
+        except Exception as e:
+            result = {"status": "unhealthy", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return result
+
+    def _check_ollama(self) -> Dict:
+        endpoints = self.ollama.router.probe()
+        if not any(endpoint["healthy"] for endpoint in endpoints):
+            raise RuntimeError("No Ollama endpoint has its model available")
+        return {"endpoints": endpoints}
+
+    def _check_database(self) -> Dict:
+        conn = sqlite3.connect(self.db_path, timeout=HEALTH_PROBE_TIMEOUT)
+        try:
+            conn.execute("SELECT 1 FROM products LIMIT 1").fetchall()
+        finally:
+            conn.close()
+        return {}
+
+    def _check_vector_store(self) -> Dict:
+        return {"documents": self.rag_service.count()}
+
+    def probe(self) -> Dict:
+        services = {
+            "ollama": self._check(self._check_ollama),
+            "database": self._check(self._check_database),
+            "vector_store": self._check(self._check_vector_store)
+        }
+        # The API degrades gracefully without the LLM, so only the stores gate readiness
+        ready = all(services[name]["status"] == "healthy" for name in ("database", "vector_store"))
+        self.status = {
+            "ready": ready,
+            "checked_at": datetime.now().isoformat(),
+            "services": services
+        }
+        return self.status
+
+SEARCH_LOG_PATTERN = re.compile(r"Received search request - Query: '(.*)', Session ID")
+
+def count_logged_searches(log_path: str) -> Counter:
+    """Normalized search queries in the API request log, with how often each was sent"""
+    counts = Counter()
+    if not os.path.exists(log_path):
+        return counts
+    with open(log_path, errors="ignore") as f:
+        for line in f:
+            match = SEARCH_LOG_PATTERN.search(line)
+            if match:
+                counts[normalize_query(match.group(1))] += 1
+    return counts
+
+class CatalogSnapshot:
+    """The catalog and everything derived from it, as of one consistent read.
+
+    Snapshots are never modified after they are built; a reload builds a new one
+    and swaps the reference, so a request that already holds a snapshot keeps
+    reading that version until it finishes. Catalogs above
+    CATALOG_SNAPSHOT_MAX_PRODUCTS are not held in memory: products, by_id and
+    products_json are None and callers read products from the database instead.
+    """
+
+    def __init__(self, version: int, products: Optional[List[Product]], categories: List[str],
+                 product_count: int, knowledge_version: Optional[str], suggest_index: SuggestIndex):
+        self.version = version
+        self.products = products
+        self.by_id = {product.id: product for product in products} if products is not None else None
+        self.categories = categories
+        self.product_count = product_count
+        self.knowledge_version = knowledge_version
+        self.suggest_index = suggest_index
+        # /api/products is served from these bytes instead of re-serializing the catalog per request
+        self.products_json = (json.dumps([product.model_dump() for product in products]).encode()
+                              if products is not None else None)
+        self.loaded_at = datetime.now().isoformat()
+
+class CatalogManager:
+    """Keeps the current CatalogSnapshot and rebuilds it when the catalog changes.
+
+    Reloads are requested through /api/admin/reload, SIGHUP, or the watcher
+    thread, which polls products.db every CATALOG_WATCH_SECONDS for a new
+    PRAGMA data_version or a replaced or modified file (shard files included).
+    A reload reads each database file in one transaction, builds the snapshot off to the side and swaps it in under the
+    next version number. When the knowledge version recorded by init_data.py
+    changes, or its store was replaced, the RAG service reopens it as well.
+    """
+
+    def __init__(self, db_path: str, rag_service, shard_paths: Optional[List[str]] = None,
+                 log_path: str = WARMUP_QUERY_LOG, watch_interval: float = CATALOG_WATCH_SECONDS):
+        self.db_path = db_path
+        self.shard_paths = shard_paths or [db_path]
+        self.rag_service = rag_service
+        self.log_path = log_path
+        self.watch_interval = watch_interval
+        self.reloads = 0
+        self.last_reload = None
+        self._snapshot = None
+        self._version = 0
+        self._signature = None
+        self._reload_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._reloading = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def current(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            # First use before warm-up built one
+            self.reload("initial")
+            snapshot = self._snapshot
+        return snapshot
+
+    async def snapshot(self) -> CatalogSnapshot:
+        """current, for handlers: a missing first snapshot is built on the I/O pool, not the event loop"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        return await io_pool.run(lambda: self.current)
+
+    def _files(self) -> List[str]:
+        return list(dict.fromkeys([self.db_path, *self.shard_paths]))
+
+    def _file_signature(self) -> Optional[Tuple[Tuple[int, int], ...]]:
+        """(inode, mtime) of products.db, then of each shard file"""
+        signature = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            signature.append((stat.st_ino, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _count(self) -> int:
+        total = 0
+        for path in self.shard_paths:
+            conn = sqlite3.connect(path)
+            try:
+                total += conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+            except sqlite3.OperationalError:
+                pass  # Database not initialized yet
+            finally:
+                conn.close()
+        return total
+
+    def _read(self, columns: str = "*") -> Tuple[List[Dict], Optional[str]]:
+        rows = []
+        knowledge_version = None
+        for path in self._files():
+            conn = sqlite3.connect(path)
+            conn.row_factory = sqlite3.Row
+            try:
+                # One read transaction per file; unsharded, products and metadata come from the same commit
+                conn.execute("BEGIN")
+                if path in self.shard_paths:
+                    try:
+                        rows.extend(dict(row) for row in conn.execute(f"SELECT {columns} FROM products"))
+                    except sqlite3.OperationalError:
+                        pass  # Database not initialized yet
+                if path == self.db_path:
+                    try:
+                        row = conn.execute("SELECT value FROM metadata WHERE key = 'knowledge_version'").fetchone()
+                        knowledge_version = row[0] if row else None
+                    except sqlite3.OperationalError:
+                        pass
+                conn.rollback()
+            finally:
+                conn.close()
+        if len(self.shard_paths) > 1:
+            rows.sort(key=lambda row: row["id"])
+        return rows, knowledge_version
+
+    def reload(self, reason: str = "manual") -> Dict:
+        with self._reload_lock:
+            start = time.perf_counter()
+            signature = self._file_signature()
+            # A large catalog is read with only the columns suggestions and categories need
+            in_memory = self._count() <= CATALOG_SNAPSHOT_MAX_PRODUCTS
+            rows, knowledge_version = self._read(
+                "*" if in_memory else "id, name, category, margin, ingredients, benefits")
+            suggest_index = SuggestIndex(build_entries(
+                rows, SPECIAL_TERM_MAPPINGS,
+                count_logged_searches(self.log_path), SUGGEST_MARGIN_WEIGHT, SUGGEST_POPULARITY_WEIGHT
+            ))
+            categories = list(dict.fromkeys(row["category"] for row in rows))
+            products = [Product(**row) for row in rows] if in_memory else None
+            product_count = len(rows)
+            del rows
+
+            previous = self._snapshot
+            knowledge_changed = previous is not None and knowledge_version != previous.knowledge_version
+            if knowledge_changed or self.rag_service.is_stale():
+                self.rag_service.reload()
+
+            snapshot = CatalogSnapshot(self._version + 1, products, categories, product_count,
+                                       knowledge_version, suggest_index)
+            self._version = snapshot.version
+            self._signature = signature
+            self._snapshot = snapshot
+            # Cached search results belong to the previous version
+            search_cache.set_version(snapshot.version)
+            self.reloads += 1
+            self.last_reload = {
+                "reason": reason,
+                "version": snapshot.version,
+                "products": product_count,
+                "products_in_memory": in_memory,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "finished_at": snapshot.loaded_at
+            }
+        logger.info(f"Loaded catalog version {snapshot.version} ({reason}): {product_count} products"
+                    f"{'' if in_memory else ' (not held in memory)'}, "
+                    f"{len(suggest_index)} suggestions in {self.last_reload['duration_ms']} ms")
+        return self.last_reload
+
+    def _reload_in_background(self, reason: str):
+        try:
+            self.reload(reason)
+        except Exception as e:
+            logger.error(f"Catalog reload ({reason}) failed: {e}")
+        finally:
+            with self._state_lock:
+                self._reloading = False
+
+    def request_reload(self, reason: str = "manual") -> bool:
+        """Start a reload on a background thread unless one is already running"""
+        with self._state_lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload_in_background, args=(reason,), daemon=True).start()
+        return True
+
+    def start(self):
+        if self.watch_interval > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _watch(self):
+        conn = None
+        inode = data_version = None
+        try:
+            while not self._stop_event.wait(self.watch_interval):
+                signature = self._file_signature()
+                if signature is None or self._snapshot is None:
+                    continue
+                try:
+                    if conn is None or signature[0][0] != inode:
+                        # data_version is tracked per connection and per file; start over on a new file
+                        if conn is not None:
+                            conn.close()
+                        conn = sqlite3.connect(self.db_path)
+                        inode, data_version = signature[0][0], None
+                    current = conn.execute("PRAGMA data_version").fetchone()[0]
+                except sqlite3.Error as e:
+                    logger.warning(f"Catalog watcher could not read {self.db_path}: {e}")
+                    continue
+                changed = signature != self._signature or (data_version is not None and current != data_version)
+                data_version = current
+                if changed:
+                    self.request_reload("watcher")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "products": snapshot.product_count if snapshot else None,
+            "products_in_memory": snapshot.products is not None if snapshot else None,
+            "suggestions": len(snapshot.suggest_index) if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "reloads": self.reloads,
+            "reloading": self._reloading,
+            "last_reload": self.last_reload
+        }
+
+class WarmupService:
+    """Brings cold dependencies up to speed before the worker reports ready.
+
+    Each step is timed and failures are logged rather than fatal; a cold
+    dependency is slow, not broken.
+    """
+
+    def __init__(self, product_service: ProductService, rag_service: RAGService,
+                 router: OllamaRouter, prober: HealthProber, catalog: CatalogManager):
+        self.product_service = product_service
+        self.rag_service = rag_service
+        self.router = router
+        self.prober = prober
+        self.catalog = catalog
+
+    def _warm_database(self) -> Dict:
+        # Large catalogs are never loaded whole, so only the pages are touched
+        product_count = self.product_service.warm_tables()
+        self.product_service.get_categories()
+        conn = sqlite3.connect(self.product_service.db_path)
+        try:
+            # Pull the answer table's primary key index into the page cache too
+            conn.execute("SELECT COUNT(*) FROM precomputed_answers").fetchone()
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            conn.close()
+        return {"products": product_count}
+
+    def top_queries(self, log_path: str = WARMUP_QUERY_LOG, limit: int = WARMUP_TOP_QUERIES) -> List[str]:
+        """Most frequent search queries in the API request log"""
+        if limit <= 0:
+            return []
+        counts = count_logged_searches(log_path)
+        return [query for query, _ in counts.most_common(limit) if query]
+
+    def _prime_searches(self) -> Dict:
+        queries = self.top_queries()
+        for query in queries:
+            self.product_service.search_products(query, limit=SEARCH_RESULT_LIMIT)
+        return {"queries": len(queries)}
+
+    def run(self) -> Dict:
+        self.prober.warmup = {"status": "running"}
+        start = time.perf_counter()
+        steps = {}
+        for name, step in (
+            ("embedding_model", lambda: {"dimensions": len(embedding_model.encode(["warm up"])[0])}),
+            ("vector_store", lambda: {"results": len(self.rag_service.query_knowledge("warm up", n_results=1))}),
+            ("database", self._warm_database),
+            ("catalog", lambda: self.catalog.reload("warmup")),
+            ("ollama", lambda: {"loaded": self.router.load_models(OLLAMA_KEEP_ALIVE)}),
+            ("search", self._prime_searches)
+        ):
+            step_start = time.perf_counter()
+            try:
+                result = {"status": "ok", **step()}
+            except Exception as e:
+                logger.warning(f"Warm-up step {name} failed: {e}")
+                result = {"status": "failed", "error": str(e)}
+            result["duration_ms"] = round((time.perf_counter() - step_start) * 1000, 1)
+            steps[name] = result
+
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        self.prober.warmup = {
+            "status": "complete",
+            "duration_ms": duration_ms,
+            "finished_at": datetime.now().isoformat(),
+            "steps": steps
+        }
+        logger.info(f"Warm-up completed in {duration_ms} ms")
+        return self.prober.warmup
 
 # Initialize services
+precomputed_answer_stats = Counter()
+speculative_search_stats = Counter()
 product_service = ProductService()
 conversational_service = ConversationalService()
+health_prober = HealthProber(product_service.db_path, conversational_service.rag_service,
+                             conversational_service.ollama)
+
+catalog = CatalogManager(product_service.db_path, conversational_service.rag_service,
+                         product_service.shard_paths)
+
+warmup_service = WarmupService(product_service, conversational_service.rag_service,
+                               conversational_service.ollama.router, health_prober, catalog)
 
 # API Routes
 @app.get("/")
 async def root():
     return {"message": "Conversational Store API", "status": "running"}
 
+async def lookup_products(product_ids: List[int]) -> Dict[int, Product]:
+    """Products by id from the catalog snapshot, or from the database if the snapshot holds no products"""
+    snapshot = await catalog.snapshot()
+    if snapshot.by_id is not None:
+        return {product_id: snapshot.by_id[product_id] for product_id in product_ids if product_id in snapshot.by_id}
+    products = await io_pool.run(product_service.get_products_by_ids, product_ids)
+    return {product.id: product for product in products}
+
 @app.get("/api/products", response_model=List[Product])
 async def get_products():
     try:
-        return product_service.get_all_products()
+        snapshot = await catalog.snapshot()
+        if snapshot.products_json is None:
+            # Too large to keep serialized in every worker; built per request instead
+            products = await io_pool.run(product_service.get_all_products)
+            content = json.dumps([product.model_dump() for product in products]).encode()
+        else:
+            content = snapshot.products_json
+        return Response(content=content, media_type="application/json",
+                        headers={"X-Catalog-Version": str(snapshot.version)})
     except Exception as e:
         logger.error(f"Error fetching products: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch products")
@@ -631,26 +2343,47 @@ async def get_products():
 @app.get("/api/categories")
 async def get_categories():
     try:
-        return {"categories": product_service.get_categories()}
+        return {"categories": (await catalog.snapshot()).categories}
     except Exception as e:
         logger.error(f"Error fetching categories: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch categories")
 
+# Declared before /api/products/{product_id} so "batch" is never read as an id
+@app.post("/api/products/batch", response_model=ProductBatchResponse)
+async def get_products_batch(request: ProductBatchRequest):
+    if len(request.ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BATCH_MAX_IDS} ids per batch")
+    ids = list(dict.fromkeys(request.ids))
+    try:
+        by_id = await lookup_products(ids)
+    except Exception as e:
+        logger.error(f"Error fetching product batch: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch products")
+    return ProductBatchResponse(products=[by_id[product_id] for product_id in ids if product_id in by_id],
+                                missing=[product_id for product_id in ids if product_id not in by_id])
+
 @app.get("/api/products/{product_id}", response_model=Product)
 async def get_product(product_id: int):
-    product = product_service.get_product_by_id(product_id)
+    product = (await lookup_products([product_id])).get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+@app.get("/api/suggest")
+async def suggest(q: str = "", limit: int = SUGGEST_LIMIT):
+    # Served from memory with no SQL or LLM work, so it runs on the event loop rather than a pool
+    snapshot = await catalog.snapshot()
+    return {"query": q, "suggestions": snapshot.suggest_index.lookup(q, max(0, min(limit, 50)))}
+
 @app.post("/api/search", response_model=SearchResponse)
 async def search_products(request: SearchRequest):
     try:
         logger.info(f"Received search request - Query: '{request.query}', Session ID: {request.session_id}")
         logger.info(f"Conversation history length: {len(request.conversation_history)}")
         
-        # Process the search request
-        response = conversational_service.process_search(request)
+        # Process the search request; it waits on the LLM, so it runs on the request
+        # threadpool rather than holding one of the bounded I/O workers
+        response = await run_in_threadpool(with_request_context(conversational_service.process_search), request)
         logger.info(f"Search response generated - Found {len(response.products)} products")
         logger.info(f"Response message: '{response.message[:100]}...'")
         
@@ -660,30 +2393,91 @@ async def search_products(request: SearchRequest):
             response.llm_output = llm_output
 
         return response
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=503, detail="Search is busy, please retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Search error: {e}")
         logger.exception("Search error details:")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@app.post("/api/search/batch", response_model=SearchBatchResponse)
+async def search_batch(request: SearchBatchRequest):
+    """Run independent searches concurrently; each item reports its own result or error.
+
+    Batch searches are stateless: every query gets a throwaway session, so they
+    neither read nor grow any stored conversation.
+    """
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch")
+    logger.info(f"Received search batch - {len(request.queries)} queries")
+    
+    limiter = asyncio.Semaphore(SEARCH_BATCH_CONCURRENCY)
+    
+    async def run(query: str) -> SearchBatchItem:
+        async with limiter:
+            try:
+                search_request = SearchRequest(query=query, session_id="",
+                                               conversation_history=request.conversation_history)
+                response = await run_in_threadpool(with_request_context(conversational_service.process_search),
+                                                   search_request, ConversationSession())
+                return SearchBatchItem(query=query, response=response)
+            except LLMOverloadedError as e:
+                return SearchBatchItem(query=query, error="Search is busy, please retry shortly",
+                                       retry_after=e.retry_after)
+            except Exception as e:
+                logger.error(f"Search error for batch query '{query}': {e}")
+                return SearchBatchItem(query=query, error=f"Search failed: {str(e)}")
+    
+    # Queries that normalize to the same text run once and share their result;
+    # matching intents and LLM calls across different queries coalesce in flight
+    unique = {}
+    for query in request.queries:
+        unique.setdefault(normalize_query(query), query)
+    results = dict(zip(unique, await asyncio.gather(*(run(query) for query in unique.values()))))
+    
+    return SearchBatchResponse(results=[
+        results[normalize_query(query)].model_copy(update={"query": query}) for query in request.queries
+    ])
 
 @app.post("/api/ask", response_model=AskResponse)
 async def ask_question(request: AskRequest):
     try:
-        session_id = request.session_id or str(uuid4())
+        session_id = request.session_id or str(uuid.uuid4())
+        session = conversations.get(session_id)
+
+        logger.info(f"Received ask request - Question: '{request.question}', Product ID: {request.product_id}")
 
         # Get relevant products if product_id provided
         relevant_products = []
+        precomputed = None
         if request.product_id:
-            product = product_service.get_product_by_id(request.product_id)
+            product = (await lookup_products([request.product_id])).get(request.product_id)
             if product:
                 relevant_products = [product]
+                precomputed = await io_pool.run(product_service.get_precomputed_answer,
+                                                request.product_id, request.question)
+                precomputed_answer_stats["hits" if precomputed else "misses"] += 1
+
+        if precomputed:
+            # Answered offline by precompute_answers.py for this version of the product and knowledge
+            answer = precomputed["answer"]
+            citations = precomputed["citations"]
+        else:
+            # One retrieval serves both the answer and its citations
+            rag_docs = await io_pool.run(conversational_service.retrieve_knowledge, request.question,
+                                         relevant_products[0].id if relevant_products else None)
 
-        # Generate answer
-        answer = conversational_service.answer_question(request.question, relevant_products)
+            # Generate answer
+            answer = await run_in_threadpool(with_request_context(conversational_service.answer_question),
+                                             request.question, relevant_products, session, rag_docs)
 
-        # Get citations from RAG
-        rag_docs = conversational_service.rag_service.query_knowledge(request.question, n_results=2)
-        citations = [doc['content'][:100] + "..." for doc in rag_docs if doc['score'] > 0.7]
+            # Get citations from RAG
+            citations = conversational_service.get_citations(request.question, rag_docs)
+
+        timestamp = datetime.now().isoformat()
+        session.history.append({"role": "user", "content": request.question, "timestamp": timestamp})
+        session.history.append({"role": "assistant", "content": answer, "timestamp": timestamp})
 
         # Add LLM output if the field exists
         llm_output = f"LLM reasoning for the question: {request.question}"
@@ -694,28 +2488,69 @@ async def ask_question(request: AskRequest):
             session_id=session_id,
             llm_output=llm_output if "llm_output" in AskResponse.__fields__ else None
         )
+    except LLMOverloadedError as e:
+        raise HTTPException(status_code=503, detail="Assistant is busy, please retry shortly",
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Ask error: {e}")
         raise HTTPException(status_code=500, detail="Failed to process question")
 
+@app.get("/api/admin/stats")
+async def get_stats():
+    return {
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_router": ollama_router.stats(),
+        "precomputed_answers": dict(precomputed_answer_stats),
+        "speculative_search": dict(speculative_search_stats),
+        "catalog": catalog.stats(),
+        "search_cache": search_cache.stats(),
+        "thread_pools": {pool.name: pool.stats() for pool in (io_pool, cpu_pool, shard_pool)},
+        "single_flight": {
+            flight.name: flight.stats() for flight in (llm_flight, search_flight, intent_flight)
+        }
+    }
+
+@app.post("/api/admin/reload")
+async def reload_catalog(wait: bool = False):
+    """Rebuild the catalog snapshot; requests in flight finish on the version they started with"""
+    if wait:
+        return {"reloaded": await io_pool.run(catalog.reload, "admin"), **catalog.stats()}
+    return {"started": catalog.request_reload("admin"), **catalog.stats()}
+
+@app.get("/api/admin/profiles")
+async def list_profiles():
+    return {"profiles": profile_store.list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    profile = profile_store.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.get("/api/health/live")
+async def liveness_check():
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    status = {**health_prober.status, "warmup": health_prober.warmup}
+    if not health_prober.is_ready():
+        return JSONResponse(status_code=503, content={"status": "not_ready", **status})
+    return {"status": "ready", **status}
+
 @app.get("/api/health")
 async def health_check():
-    # Check Ollama connection
-    try:
-        ollama_service = OllamaService()
-        test_response = ollama_service.generate("Test", max_tokens=10)
-        ollama_status = "healthy" if test_response else "unhealthy"
-    except:
-        ollama_status = "unhealthy"
+    status = health_prober.status
+    services = {name: result["status"] for name, result in status["services"].items()}
+    overall = "healthy" if all(value == "healthy" for value in services.values()) else "degraded"
     
     return {
-        "status": "healthy",
+        "status": overall if health_prober.is_ready() else "unhealthy",
         "timestamp": datetime.now().isoformat(),
-        "services": {
-            "ollama": ollama_status,
-            "database": "healthy",
-            "vector_store": "healthy"
-        }
+        "checked_at": status["checked_at"],
+        "services": services,
+        "warmup": health_prober.warmup["status"]
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Precompute answers to frequent product questions so /api/ask can skip live generation
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DB_PATH = "data/products.db"
+REQUEST_LOG_FILE = "../backend.log"
+
+# Asked across most products; used when no request log is available
+SEED_QUESTIONS = [
+    "How do I use this product?",
+    "Is it safe for sensitive skin?",
+    "Can I use it every day?",
+    "What skin type is this best for?",
+    "What are the key ingredients?",
+    "Can I use it with retinol?",
+    "Can I use it with vitamin C?",
+    "Is it suitable for acne-prone skin?",
+    "Should I use it morning or night?",
+    "How long until I see results?"
+]
+
+# Written by the /api/ask handler for every request
+ASK_LOG_PATTERN = re.compile(r"Received ask request - Question: '(.*)', Product ID: (\d+)")
+
+def mine_questions(log_path, top_n, min_count):
+    """Most frequent product-scoped questions in the API request log"""
+    from main import normalize_question
+
+    counts = Counter()
+    examples = {}
+    with open(log_path, errors="ignore") as f:
+        for line in f:
+            match = ASK_LOG_PATTERN.search(line)
+            if not match:
+                continue
+            key = normalize_question(match.group(1))
+            counts[key] += 1
+            examples.setdefault(key, match.group(1))
+
+    questions = [examples[key] for key, count in counts.most_common(top_n) if count >= min_count]
+    logger.info(f"Mined {len(questions)} frequent questions from {sum(counts.values())} logged asks")
+    return questions
+
+def load_questions(args):
+    questions = []
+    if args.questions:
+        with open(args.questions) as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    if args.log and os.path.exists(args.log):
+        questions.extend(mine_questions(args.log, args.top, args.min_count))
+    if not questions:
+        questions = list(SEED_QUESTIONS)
+
+    # Deduplicate on the same key /api/ask looks answers up by
+    from main import normalize_question
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+    return unique
+
+def load_products(product_ids):
+    from catalog_shards import shard_paths
+
+    rows = []
+    for path in shard_paths(DB_PATH):
+        shard = sqlite3.connect(path)
+        shard.row_factory = sqlite3.Row
+        try:
+            rows.extend(shard.execute("SELECT * FROM products WHERE content_hash IS NOT NULL").fetchall())
+        finally:
+            shard.close()
+    if product_ids:
+        rows = [row for row in rows if row["id"] in product_ids]
+    return rows
+
+def existing_answers(conn, version):
+    rows = conn.execute(
+        "SELECT product_hash, question_key FROM precomputed_answers WHERE knowledge_version = ?",
+        (version,)
+    ).fetchall()
+    return set((row[0], row[1]) for row in rows)
+
+def precompute(product, question, conversational_service, product_model):
+    from main import LLM_ERROR_MESSAGE
+
+    product_obj = product_model(**dict(product))
+    # Same product-scoped retrieval as /api/ask
+    rag_docs = conversational_service.retrieve_knowledge(question, product_obj.id)
+    answer = conversational_service.answer_question(question, [product_obj], rag_docs=rag_docs)
+    if answer == LLM_ERROR_MESSAGE:
+        raise RuntimeError("Ollama did not produce an answer")
+    citations = conversational_service.get_citations(question, rag_docs)
+    return answer, citations
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", help="seed file with one question per line")
+    parser.add_argument("--log", default=REQUEST_LOG_FILE, help="API log to mine frequent questions from")
+    parser.add_argument("--top", type=int, default=200, help="number of mined questions to keep")
+    parser.add_argument("--min-count", type=int, default=3, help="minimum times a mined question was asked")
+    parser.add_argument("--product", type=int, action="append", help="only precompute for these product ids")
+    parser.add_argument("--workers", type=int, default=2, help="concurrent Ollama generations")
+    parser.add_argument("--force", action="store_true", help="regenerate answers that are still current")
+    args = parser.parse_args()
+
+    # The job's own LLM scheduler admits exactly as many calls as there are workers
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.workers)
+    from main import Product, conversational_service
+
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute("SELECT value FROM metadata WHERE key = 'knowledge_version'").fetchone()
+    if not row:
+        raise SystemExit("No knowledge version recorded, run init_data.py first")
+    version = row[0]
+
+    questions = load_questions(args)
+    products = load_products(set(args.product or []))
+    done = set() if args.force else existing_answers(conn, version)
+
+    jobs = [
+        (product, key, question)
+        for product in products
+        for key, question in questions.items()
+        if (product["content_hash"], key) not in done
+    ]
+    logger.info(f"Precomputing {len(jobs)} answers ({len(products)} products x {len(questions)} questions, "
+                f"{len(products) * len(questions) - len(jobs)} already current)")
+
+    completed = failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(precompute, product, question, conversational_service, Product): (product, key, question)
+            for product, key, question in jobs
+        }
+        for future in as_completed(futures):
+            product, key, question = futures[future]
+            try:
+                answer, citations = future.result()
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to answer '{question}' for product {product['id']}: {e}")
+                continue
+
+            # Results are written from this thread only, so SQLite sees a single writer
+            conn.execute("""
+            INSERT OR REPLACE INTO precomputed_answers
+            (product_hash, question_key, knowledge_version, product_id, question, answer, citations, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (product["content_hash"], key, version, product["id"], question, answer,
+                  json.dumps(citations), datetime.now().isoformat()))
+            conn.commit()
+            completed += 1
+            if completed % 50 == 0:
+                logger.info(f"Precomputed {completed}/{len(jobs)} answers")
+
+    conn.close()
+
+    print(f"\n📊 Precomputation Summary:")
+    print(f"✅ Answers generated: {completed}")
+    print(f"❌ Failed: {failed}")
+    print(f"✅ Knowledge version: {version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+In-memory prefix index for search-box suggestions
+
+Suggestion keys are kept in a sorted list, so the keys sharing a prefix form one
+contiguous range found with two bisections. Short prefixes can span most of a
+large catalog, so their best results are precomputed at build time; longer
+prefixes pick the top weights of their (much smaller) range with argpartition.
+"""
+
+import math
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from knowledge_index import top_k
+
+PREFIX_CACHE_LENGTH = 3
+PREFIX_CACHE_SIZE = 10
+
+def normalize_key(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+def split_list(value: Optional[str]) -> List[str]:
+    """Items of a comma-separated catalog field such as ingredients or benefits"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+def build_entries(products: Iterable[Dict], synonyms: Dict[str, str], search_counts: Counter,
+                  margin_weight: float = 0.5, popularity_weight: float = 0.5) -> List[Tuple[str, float, Dict]]:
+    """Weighted suggestions from catalog rows, synonym mappings and logged search counts.
+
+    Names, categories, ingredients and benefits are suggested as written in the
+    catalog. Popularity is how many products share a phrase plus how often it
+    was searched for; margin is the best margin among those products.
+    """
+    phrases = {}  # key -> [text, type, margin, product count, product id]
+    name_words = Counter()
+
+    def add(text, kind, margin, product_id=None):
+        key = normalize_key(text)
+        if not key:
+            return
+        entry = phrases.get(key)
+        if entry is None:
+            phrases[key] = [text, kind, margin, 1, product_id]
+            return
+        entry[3] += 1
+        if margin > entry[2]:
+            entry[2] = margin
+            entry[4] = product_id if entry[1] == "product" else None
+
+    for product in products:
+        margin = product.get("margin") or 0.0
+        add(product["name"], "product", margin, product["id"])
+        add(product["category"], "category", margin)
+        for ingredient in split_list(product.get("ingredients")):
+            add(ingredient, "ingredient", margin)
+        for benefit in split_list(product.get("benefits")):
+            add(benefit, "benefit", margin)
+        name_words.update(set(normalize_key(product["name"]).split()))
+
+    # Synonyms suggest their canonical phrase once, however many terms map to it;
+    # the terms' popularity counts toward that one suggestion
+    aliases = {}  # canonical key -> synonym keys that are not suggestions of their own
+    for canonical in synonyms.values():
+        key = normalize_key(canonical)
+        if key and key not in phrases:
+            phrases[key] = [canonical, "term", 0.0, name_words.get(key, 0), None]
+    for term, canonical in synonyms.items():
+        key, term_key = normalize_key(canonical), normalize_key(term)
+        if key and term_key not in phrases:
+            aliases.setdefault(key, set()).add(term_key)
+    for key, terms in aliases.items():
+        phrases[key][3] += sum(name_words.get(term, 0) for term in terms)
+
+    if not phrases:
+        return []
+    max_margin = max(entry[2] for entry in phrases.values()) or 1.0
+    popularity = {
+        key: entry[3] + search_counts.get(key, 0) + sum(search_counts.get(term, 0) for term in aliases.get(key, ()))
+        for key, entry in phrases.items()
+    }
+    max_popularity = math.log1p(max(popularity.values())) or 1.0
+
+    entries = []
+    for key, (text, kind, margin, _, product_id) in phrases.items():
+        weight = (margin_weight * margin / max_margin
+                  + popularity_weight * math.log1p(popularity[key]) / max_popularity)
+        payload = {"text": text, "type": kind}
+        if product_id is not None:
+            payload["product_id"] = product_id
+        entries.append((key, weight, payload))
+    return entries
+
+class SuggestIndex:
+    def __init__(self, entries: Iterable[Tuple[str, float, Dict]],
+                 cache_length: int = PREFIX_CACHE_LENGTH, cache_size: int = PREFIX_CACHE_SIZE):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self.keys = [key for key, _, _ in entries]
+        self.weights = np.fromiter((weight for _, weight, _ in entries), dtype=np.float32, count=len(entries))
+        self.payloads = [payload for _, _, payload in entries]
+        self.cache_length = cache_length
+        self.cache_size = cache_size
+
+        # Best entries for every short prefix, filled in descending weight order
+        self._top = {}
+        for i in np.argsort(-self.weights, kind="stable").tolist():
+            key = self.keys[i]
+            for n in range(1, min(cache_length, len(key)) + 1):
+                bucket = self._top.setdefault(key[:n], [])
+                if len(bucket) < cache_size:
+                    bucket.append(i)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, prefix: str, limit: int = 8) -> List[Dict]:
+        prefix = normalize_key(prefix)
+        if not prefix or limit <= 0:
+            return []
+        if len(prefix) <= self.cache_length and limit <= self.cache_size:
+            indices = self._top.get(prefix, [])[:limit]
+        else:
+            lo = bisect_left(self.keys, prefix)
+            hi = bisect_left(self.keys, prefix + "\uffff", lo)
+            indices = (lo + top_k(self.weights[lo:hi], limit)).tolist()
+        return [dict(self.payloads[i], score=round(float(self.weights[i]), 4)) for i in indices]